@@ -13,6 +13,8 @@ Features:
 - Metadata tracking for each download
 - Retry logic with exponential backoff
 - Size limits to prevent abuse
+- Concurrent batch downloads over pooled connections
+- Conditional GET (If-None-Match) for callers that track ETags
 
 Usage:
     from attachment_downloader import AttachmentDownloader
@@ -32,29 +34,119 @@ Package: juno-code@1.x.x
 Auto-installed by: ScriptInstaller
 """
 
+import functools
 import hashlib
 import json
 import logging
 import os
 import re
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple, Any
+from typing import Callable, Dict, List, Optional, Set, Tuple, Any
 from urllib.parse import urlparse
 
 try:
     import requests
+    from requests.adapters import HTTPAdapter
 except ImportError:
     print("Error: Missing required dependency: requests")
     print("Please run: pip install requests")
     import sys
     sys.exit(1)
 
+# Optional faster JSON encoder for metadata files
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
 __version__ = "1.0.0"
 
 logger = logging.getLogger(__name__)
 
+# Filename sanitization patterns, compiled once; used for non-ASCII names
+_UNSAFE_STEM_CHARS = re.compile(r'[^\w\-.]')
+_UNSAFE_PREFIX_CHARS = re.compile(r'[^\w\-]')
+
+# ASCII equivalents of the patterns above as str.translate tables
+_SAFE_ASCII = frozenset('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789_-')
+_ASCII_PREFIX_TABLE = {i: '_' for i in range(128) if chr(i) not in _SAFE_ASCII}
+_ASCII_STEM_TABLE = {i: c for i, c in _ASCII_PREFIX_TABLE.items() if i != ord('.')}
+
+
+def _sanitize_part(text: str, table: Dict[int, str], pattern: re.Pattern) -> str:
+    """Replace unsafe characters with '_', collapse runs and trim underscores at the ends."""
+    text = text.translate(table) if text.isascii() else pattern.sub('_', text)
+    return '_'.join(part for part in text.split('_') if part)
+
+
+def _url_hostname(url: str) -> str:
+    """
+    Return the lowercased hostname of an absolute URL.
+
+    Slices the authority directly instead of running the full urlparse;
+    scheme-relative URLs and IPv6 literals fall back to urlparse.
+    """
+    start = url.find('://')
+    if start < 0:
+        return urlparse(url).hostname or ''
+    start += 3
+    end = len(url)
+    for sep in '/?#':
+        pos = url.find(sep, start, end)
+        if pos >= 0:
+            end = pos
+    host = url[start:end].rpartition('@')[2]
+    if host.startswith('['):
+        return urlparse(url).hostname or ''
+    return host.partition(':')[0].lower()
+
+
+def _concurrency_from_env(default: int) -> int:
+    """Read JUNO_ATTACHMENT_CONCURRENCY, falling back to default when unset or invalid."""
+    value = os.getenv('JUNO_ATTACHMENT_CONCURRENCY', '').strip()
+    if not value:
+        return default
+    try:
+        workers = int(value)
+    except ValueError:
+        logger.warning(f"Invalid JUNO_ATTACHMENT_CONCURRENCY={value!r}, using {default}")
+        return default
+    return max(workers, 1)
+
+
+@functools.lru_cache(maxsize=4096)
+def _safe_filename(original_name: str, prefix: str) -> str:
+    """
+    Build {prefix}_{sanitized_stem}{extension} for AttachmentDownloader.
+
+    The result depends only on the arguments, so repeated names are served from cache.
+    """
+    path = Path(original_name)
+    ext = path.suffix.lower()
+    stem = path.stem
+
+    # Sanitize stem: replace unsafe characters with underscores
+    stem = _sanitize_part(stem, _ASCII_STEM_TABLE, _UNSAFE_STEM_CHARS)
+
+    # Ensure stem is not empty
+    if not stem:
+        stem = 'file'
+
+    # Truncate if needed (preserve reasonable length)
+    max_stem_len = 100
+    if len(stem) > max_stem_len:
+        stem = stem[:max_stem_len]
+
+    # Sanitize prefix
+    safe_prefix = _sanitize_part(prefix, _ASCII_PREFIX_TABLE, _UNSAFE_PREFIX_CHARS)
+
+    return f"{safe_prefix}_{stem}{ext}"
+
 
 class AttachmentDownloader:
     """Handles downloading and storing attachments from various sources."""
@@ -63,12 +155,13 @@ class AttachmentDownloader:
     DEFAULT_MAX_SIZE = 50 * 1024 * 1024  # 50MB
     DEFAULT_TIMEOUT = 60  # seconds
     DEFAULT_RETRIES = 3
+    DOWNLOAD_CHUNK_SIZE = 64 * 1024  # bytes read, hashed and written per step
+    DEFAULT_CONCURRENCY = 8  # parallel downloads in download_many
 
     # Security: Only allow downloads from trusted domains
     ALLOWED_DOMAINS = [
         'files.slack.com',
         'slack-files.com',
-        'files-pri',  # Slack private files pattern
         'github.com',
         'githubusercontent.com',
         'user-images.githubusercontent.com',
@@ -115,8 +208,29 @@ class AttachmentDownloader:
         if extra_domains:
             self.ALLOWED_DOMAINS = list(self.ALLOWED_DOMAINS) + [d.strip() for d in extra_domains.split(',')]
 
+        # Hostnames are accepted on an exact match (one set lookup) or as a
+        # subdomain of an allowed entry (one str.endswith over all suffixes)
+        domains = {d.lower() for d in self.ALLOWED_DOMAINS if d}
+        self._exact_domains = frozenset(domains)
+        self._suffix_domains = tuple(sorted('.' + d for d in domains))
+
+        # One pooled session so repeated downloads from the same host (Slack,
+        # GitHub) reuse keep-alive connections instead of a new TLS handshake each
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=16)
+        self._session.mount('https://', adapter)
+        self._session.mount('http://', adapter)
+
+        # Paths chosen by downloads in flight, guarded for download_many threads
+        self._path_lock = threading.Lock()
+        self._pending_paths: Set[Path] = set()
+
         self._ensure_directories()
 
+    def close(self) -> None:
+        """Close pooled HTTP connections."""
+        self._session.close()
+
     def _parse_env_types(self, env_var: str, default: set) -> set:
         """Parse file types from environment variable."""
         env_value = os.getenv(env_var, '')
@@ -140,7 +254,9 @@ class AttachmentDownloader:
         filename_prefix: str,
         original_filename: str,
         headers: Optional[Dict[str, str]] = None,
-        metadata: Optional[Dict[str, Any]] = None
+        metadata: Optional[Dict[str, Any]] = None,
+        cached: Optional[Tuple[str, str]] = None,
+        on_etag: Optional[Callable[[str, str], None]] = None
     ) -> Tuple[Optional[str], Optional[str]]:
         """
         Download a file and save with metadata.
@@ -152,6 +268,10 @@ class AttachmentDownloader:
             original_filename: Original filename for extension preservation
             headers: HTTP headers for authentication
             metadata: Additional metadata to store with the file
+            cached: (etag, local_path) of an earlier download of url; the ETag is
+                sent as If-None-Match and local_path is returned on 304 Not Modified
+            on_etag: Called with (etag, local_path) after a download whose
+                response carried an ETag
 
         Returns:
             Tuple of (local_path, error_message)
@@ -179,44 +299,97 @@ class AttachmentDownloader:
         safe_filename = self._generate_safe_filename(original_filename, filename_prefix)
         target_path = target_dir / safe_filename
 
-        # Handle collision
-        target_path = self._handle_collision(target_path)
+        # Handle collision; the chosen path stays reserved until the download
+        # finishes so concurrent downloads of the same name cannot pick it too
+        with self._path_lock:
+            target_path = self._handle_collision(target_path)
+            self._pending_paths.add(target_path)
+        try:
+            return self._download_with_retries(
+                url, target_dir, target_path, original_filename, headers, metadata, cached, on_etag
+            )
+        finally:
+            with self._path_lock:
+                self._pending_paths.discard(target_path)
+
+    def download_many(
+        self,
+        downloads: List[Dict[str, Any]],
+        max_workers: Optional[int] = None
+    ) -> List[Tuple[Optional[str], Optional[str]]]:
+        """
+        Download several files concurrently.
+
+        Args:
+            downloads: One dict of download_file keyword arguments per file
+            max_workers: Thread count (default: JUNO_ATTACHMENT_CONCURRENCY or 8)
+
+        Returns:
+            List of (local_path, error_message) tuples in the order of downloads
+        """
+        workers = max_workers or _concurrency_from_env(self.DEFAULT_CONCURRENCY)
+        if workers <= 1 or len(downloads) <= 1:
+            return [self.download_file(**kwargs) for kwargs in downloads]
+
+        with ThreadPoolExecutor(max_workers=min(workers, len(downloads))) as pool:
+            return list(pool.map(lambda kwargs: self.download_file(**kwargs), downloads))
+
+    def _download_with_retries(
+        self,
+        url: str,
+        target_dir: Path,
+        target_path: Path,
+        original_filename: str,
+        headers: Optional[Dict[str, str]],
+        metadata: Optional[Dict[str, Any]],
+        cached: Optional[Tuple[str, str]] = None,
+        on_etag: Optional[Callable[[str, str], None]] = None
+    ) -> Tuple[Optional[str], Optional[str]]:
+        """Fetch url into target_path with retries and write its metadata file."""
+        if cached:
+            headers = {**(headers or {}), 'If-None-Match': cached[0]}
 
-        # Download with retries
         for attempt in range(self.DEFAULT_RETRIES):
             try:
-                response = requests.get(
+                # The context manager hands the connection back to the pool even
+                # when the body is not read to the end
+                with self._session.get(
                     url,
                     headers=headers or {},
                     timeout=self.timeout,
                     stream=True,
                     allow_redirects=True
-                )
-                response.raise_for_status()
-
-                # Check content length if available
-                content_length = int(response.headers.get('content-length', 0))
-                if content_length > self.max_size:
-                    return None, f"File too large: {content_length:,} bytes (max: {self.max_size:,})"
-
-                # Ensure target directory exists
-                target_dir.mkdir(parents=True, exist_ok=True)
-
-                # Download in chunks
-                sha256_hash = hashlib.sha256()
-                total_bytes = 0
-
-                with open(target_path, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        if chunk:
-                            # Check size during download (for when content-length not provided)
-                            total_bytes += len(chunk)
-                            if total_bytes > self.max_size:
-                                f.close()
-                                target_path.unlink()
-                                return None, f"File exceeded max size during download ({total_bytes:,} bytes)"
-                            f.write(chunk)
-                            sha256_hash.update(chunk)
+                ) as response:
+                    if cached and response.status_code == 304:
+                        logger.info(f"Not modified, reusing: {original_filename} -> {cached[1]}")
+                        return cached[1], None
+
+                    response.raise_for_status()
+                    etag = response.headers.get('ETag')
+
+                    # Check content length if available
+                    content_length = int(response.headers.get('content-length', 0))
+                    if content_length > self.max_size:
+                        return None, f"File too large: {content_length:,} bytes (max: {self.max_size:,})"
+
+                    # Ensure target directory exists
+                    target_dir.mkdir(parents=True, exist_ok=True)
+
+                    # Download in chunks, hashing each chunk as it is written
+                    sha256_hash = hashlib.sha256()
+                    total_bytes = 0
+
+                    with open(target_path, 'wb') as f:
+                        for chunk in response.iter_content(chunk_size=self.DOWNLOAD_CHUNK_SIZE):
+                            if chunk:
+                                # Check size during download (for when content-length not provided)
+                                total_bytes += len(chunk)
+                                if total_bytes > self.max_size:
+                                    f.close()
+                                    target_path.unlink()
+                                    return None, f"File exceeded max size during download ({total_bytes:,} bytes)"
+                                f.write(chunk)
+                                sha256_hash.update(chunk)
 
                 # Create metadata file
                 full_metadata = {
@@ -230,6 +403,8 @@ class AttachmentDownloader:
                     full_metadata.update(metadata)
 
                 self._write_metadata(target_path, full_metadata)
+                if etag and on_etag:
+                    on_etag(etag, str(target_path))
 
                 logger.info(f"Downloaded: {original_filename} -> {target_path} ({total_bytes:,} bytes)")
                 return str(target_path), None
@@ -265,33 +440,11 @@ class AttachmentDownloader:
         Returns:
             Sanitized filename: {prefix}_{sanitized_stem}{extension}
         """
-        path = Path(original_name)
-        ext = path.suffix.lower()
-        stem = path.stem
-
-        # Sanitize stem: replace unsafe characters with underscores
-        stem = re.sub(r'[^\w\-.]', '_', stem)
-        stem = re.sub(r'_+', '_', stem)  # Collapse multiple underscores
-        stem = stem.strip('_')
-
-        # Ensure stem is not empty
-        if not stem:
-            stem = 'file'
-
-        # Truncate if needed (preserve reasonable length)
-        max_stem_len = 100
-        if len(stem) > max_stem_len:
-            stem = stem[:max_stem_len]
-
-        # Sanitize prefix
-        safe_prefix = re.sub(r'[^\w\-]', '_', prefix)
-        safe_prefix = re.sub(r'_+', '_', safe_prefix).strip('_')
-
-        return f"{safe_prefix}_{stem}{ext}"
+        return _safe_filename(original_name, prefix)
 
     def _handle_collision(self, target_path: Path) -> Path:
         """
-        Handle filename collision by appending counter.
+        Handle filename collision by appending a counter above any already in use.
 
         Args:
             target_path: Intended file path
@@ -299,24 +452,32 @@ class AttachmentDownloader:
         Returns:
             Path that doesn't exist (original or with counter suffix)
         """
-        if not target_path.exists():
+        if target_path not in self._pending_paths and not target_path.exists():
             return target_path
 
-        counter = 1
         stem = target_path.stem
         suffix = target_path.suffix
         parent = target_path.parent
 
-        while True:
-            new_path = parent / f"{stem}_{counter}{suffix}"
-            if not new_path.exists():
-                logger.debug(f"Collision detected, using: {new_path}")
-                return new_path
-            counter += 1
-            if counter > 1000:  # Safety limit
-                # Use timestamp as fallback
-                ts = int(time.time() * 1000)
-                return parent / f"{stem}_{ts}{suffix}"
+        # One directory listing instead of stat-probing stem_1, stem_2, ... in turn,
+        # plus names reserved by downloads still in flight
+        names = [p.name for p in self._pending_paths if p.parent == parent]
+        try:
+            with os.scandir(parent) as entries:
+                names.extend(entry.name for entry in entries)
+        except FileNotFoundError:
+            pass
+
+        numbered = re.compile(re.escape(stem) + r'_(\d+)' + re.escape(suffix) + r'\Z')
+        highest = 0
+        for name in names:
+            match = numbered.match(name)
+            if match:
+                highest = max(highest, int(match.group(1)))
+
+        new_path = parent / f"{stem}_{highest + 1}{suffix}"
+        logger.debug(f"Collision detected, using: {new_path}")
+        return new_path
 
     def _is_allowed_domain(self, url: str) -> bool:
         """
@@ -329,17 +490,10 @@ class AttachmentDownloader:
             True if domain is allowed, False otherwise
         """
         try:
-            parsed = urlparse(url)
-            domain = parsed.netloc.lower()
-            # Check if any allowed domain is a suffix of or matches the URL domain
-            for allowed in self.ALLOWED_DOMAINS:
-                allowed_lower = allowed.lower()
-                if domain == allowed_lower or domain.endswith('.' + allowed_lower):
-                    return True
-                # Also check if the allowed pattern is contained (for patterns like 'files-pri')
-                if allowed_lower in domain:
-                    return True
-            return False
+            domain = _url_hostname(url)
+            if not domain:
+                return False
+            return domain in self._exact_domains or domain.endswith(self._suffix_domains)
         except Exception as e:
             logger.error(f"Error parsing URL {url}: {e}")
             return False
@@ -354,8 +508,11 @@ class AttachmentDownloader:
         """
         meta_path = Path(str(filepath) + '.meta.json')
         try:
-            with open(meta_path, 'w', encoding='utf-8') as f:
-                json.dump(metadata, f, indent=2, ensure_ascii=False)
+            # Serialize in one call and write once rather than streaming many small writes
+            if ORJSON_AVAILABLE:
+                meta_path.write_bytes(orjson.dumps(metadata, option=orjson.OPT_INDENT_2))
+            else:
+                meta_path.write_text(json.dumps(metadata, indent=2, ensure_ascii=False), encoding='utf-8')
             logger.debug(f"Wrote metadata: {meta_path}")
         except Exception as e:
             logger.warning(f"Failed to write metadata to {meta_path}: {e}")
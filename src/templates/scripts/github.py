@@ -32,6 +32,7 @@ Auto-installed by: ScriptInstaller
 """
 
 import argparse
+import functools
 import json
 import logging
 import os
@@ -39,6 +40,7 @@ import re
 import signal
 import subprocess
 import sys
+import tempfile
 import time
 from datetime import datetime, timezone
 from pathlib import Path
@@ -85,22 +87,31 @@ except ImportError:
 # GitHub Attachment URL Patterns
 # =============================================================================
 
-# Regex patterns to extract attachment URLs from issue body and comments
+# Regex patterns to extract attachment URLs from issue body and comments.
+# No variable-length part can cross whitespace, and URL tails also stop at the
+# brackets and quotes around markdown/HTML links, so scans stay linear.
 GITHUB_ATTACHMENT_PATTERNS = [
     # GitHub user-attachments/files (file uploads with numeric ID)
-    r'https://github\.com/user-attachments/files/\d+/[^\s\)\"\'\]]+',
+    r'https://github\.com/user-attachments/files/\d+/[^\s\)\"\'\]<>]+',
     # GitHub user-attachments/assets (new format with UUID)
-    r'https://github\.com/user-attachments/assets/[a-f0-9-]+/[^\s\)\"\'\]]+',
+    r'https://github\.com/user-attachments/assets/[a-f0-9-]+/[^\s\)\"\'\]<>]+',
     # User images (screenshots, drag-drop uploads)
-    r'https://user-images\.githubusercontent\.com/\d+/[^\s\)\"\'\]]+',
+    r'https://user-images\.githubusercontent\.com/\d+/[^\s\)\"\'\]<>]+',
     # Private user images
-    r'https://private-user-images\.githubusercontent\.com/\d+/[^\s\)\"\'\]]+',
+    r'https://private-user-images\.githubusercontent\.com/\d+/[^\s\)\"\'\]<>]+',
     # Repository assets
-    r'https://github\.com/[^/]+/[^/]+/assets/\d+/[^\s\)\"\'\]]+',
+    r'https://github\.com/[^/\s]+/[^/\s]+/assets/\d+/[^\s\)\"\'\]<>]+',
     # Objects storage
-    r'https://objects\.githubusercontent\.com/[^\s\)\"\'\]]+',
+    r'https://objects\.githubusercontent\.com/[^\s\)\"\'\]<>]+',
 ]
 
+# All patterns fused into one alternation and compiled once at import, so each
+# text is scanned in a single pass instead of once per pattern
+_GITHUB_ATTACHMENT_RE = re.compile(
+    '|'.join(f'(?:{pattern})' for pattern in GITHUB_ATTACHMENT_PATTERNS),
+    re.IGNORECASE
+)
+
 
 # =============================================================================
 # State Management Classes
@@ -816,11 +827,17 @@ def signal_handler(signum: int, frame) -> None:
     shutdown_requested = True
 
 
+# Runs of invalid tag characters and underscores, each collapsed to one underscore
+_TAG_SEPARATOR_RE = re.compile(r'[^a-zA-Z0-9-]+')
+
+
+@functools.lru_cache(maxsize=1024)
 def sanitize_tag(tag: str) -> str:
     """
     Sanitize a tag to be compatible with kanban validation.
 
     Kanban tags only allow: letters, numbers, underscores (_), and hyphens (-).
+    Results are cached since the same owners, labels and logins recur across issues.
 
     Args:
         tag: The raw tag string
@@ -828,15 +845,9 @@ def sanitize_tag(tag: str) -> str:
     Returns:
         Sanitized tag compatible with kanban system
     """
-    # Replace spaces and colons with underscores
-    tag = tag.replace(' ', '_').replace(':', '_')
-    # Remove any remaining invalid characters
-    tag = re.sub(r'[^a-zA-Z0-9_-]', '_', tag)
-    # Collapse multiple underscores
-    tag = re.sub(r'_+', '_', tag)
-    # Remove leading/trailing underscores
-    tag = tag.strip('_')
-    return tag
+    # Replace invalid characters (spaces, colons, ...) with underscores, collapsing
+    # repeats, then remove leading/trailing underscores
+    return _TAG_SEPARATOR_RE.sub('_', tag).strip('_')
 
 
 def extract_github_tag(tags: List[str]) -> Optional[str]:
@@ -975,38 +986,76 @@ def extract_attachment_urls(body: str, comments: Optional[List[Dict[str, Any]]]
         comments: Optional list of comment dicts
 
     Returns:
-        Deduplicated list of attachment URLs
+        Deduplicated list of attachment URLs, in order of first appearance
     """
-    urls = set()
-
-    def extract_from_text(text: str, source: str = "text") -> None:
-        if not text:
-            logger.debug(f"extract_attachment_urls: Empty {source}, skipping")
-            return
-        for pattern in GITHUB_ATTACHMENT_PATTERNS:
-            matches = re.findall(pattern, text, re.IGNORECASE)
-            if matches:
-                logger.debug(f"extract_attachment_urls: Pattern '{pattern[:50]}...' matched {len(matches)} URL(s) in {source}")
-                for url in matches:
-                    logger.info(f"  Detected attachment URL: {url}")
-            urls.update(matches)
-
-    # Extract from body
+    # Every pattern stops at whitespace, so newline-joined texts can be scanned
+    # in one pass without a match running from one text into the next
     logger.debug(f"extract_attachment_urls: Scanning body ({len(body) if body else 0} chars)")
-    extract_from_text(body, "body")
-
-    # Extract from comments
+    texts = [body] if body else []
     if comments:
         logger.debug(f"extract_attachment_urls: Scanning {len(comments)} comments")
-        for i, comment in enumerate(comments):
-            extract_from_text(comment.get('body', ''), f"comment[{i}]")
+        texts.extend(comment['body'] for comment in comments if comment.get('body'))
+
+    # dict keys dedupe like a set but keep first-seen order
+    urls = list(dict.fromkeys(_GITHUB_ATTACHMENT_RE.findall('\n'.join(texts))))
 
     if urls:
+        for url in urls:
+            logger.info(f"  Detected attachment URL: {url}")
         logger.info(f"extract_attachment_urls: Found {len(urls)} unique attachment URL(s)")
     else:
         logger.debug("extract_attachment_urls: No attachment URLs found")
 
-    return list(urls)
+    return urls
+
+
+# ETags of downloaded attachments, one cache file per repository attachment
+# directory; a 304 answer to If-None-Match reuses the local copy
+GITHUB_ETAG_CACHE_FILENAME = '.etag_cache.json'
+GITHUB_ETAG_CACHE_MAX_ENTRIES = 1000
+
+
+def _load_attachment_etags(cache_path: Path) -> Dict[str, Dict[str, str]]:
+    """
+    Load an attachment ETag cache.
+
+    Args:
+        cache_path: Path to the cache file
+
+    Returns:
+        Mapping of cache key to {'etag', 'path'}; empty if missing or unreadable
+    """
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+        return cache if isinstance(cache, dict) else {}
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable ETag cache {cache_path}: {e}")
+        return {}
+
+
+def _save_attachment_etags(cache_path: Path, etags: Dict[str, Dict[str, str]]) -> None:
+    """
+    Atomically write an attachment ETag cache, keeping the newest entries.
+
+    Args:
+        cache_path: Path to the cache file
+        etags: Mapping of cache key to {'etag', 'path'}, oldest first
+    """
+    entries = dict(list(etags.items())[-GITHUB_ETAG_CACHE_MAX_ENTRIES:])
+    tmp_path = None
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=cache_path.parent, prefix=cache_path.name, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(entries, f, ensure_ascii=False)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        logger.warning(f"Failed to write ETag cache {cache_path}: {e}")
+        if tmp_path and os.path.exists(tmp_path):
+            os.unlink(tmp_path)
 
 
 def download_github_attachments(
@@ -1014,17 +1063,24 @@ def download_github_attachments(
     token: str,
     repo: str,
     issue_number: int,
-    downloader: 'AttachmentDownloader'
+    downloader: 'AttachmentDownloader',
+    max_workers: Optional[int] = None
 ) -> List[str]:
     """
     Download GitHub attachment files.
 
+    Downloads run concurrently through downloader.download_many; results
+    keep the order of urls. ETags are cached per repository directory and
+    issue, so an unchanged attachment is revalidated instead of downloaded.
+
     Args:
         urls: List of attachment URLs
         token: GitHub token for authentication
         repo: Repository in owner/repo format
         issue_number: Issue number
         downloader: AttachmentDownloader instance
+        max_workers: Maximum number of concurrent downloads
+            (default: JUNO_ATTACHMENT_CONCURRENCY or 8)
 
     Returns:
         List of local file paths
@@ -1042,6 +1098,24 @@ def download_github_attachments(
     repo_dir = repo.replace('/', '_')
     target_dir = downloader.base_dir / 'github' / repo_dir
 
+    # Identical for every URL of the issue; download_file only reads them
+    filename_prefix = f"issue_{issue_number}"
+    metadata = {
+        'source': 'github',
+        'repo': repo,
+        'issue_number': issue_number,
+    }
+
+    # Cache keys include the issue prefix, so a cached path always belongs to
+    # this issue and lives in this repository's target_dir
+    cache_path = target_dir / GITHUB_ETAG_CACHE_FILENAME
+    etags = _load_attachment_etags(cache_path)
+    fresh_etags: Dict[str, Dict[str, str]] = {}
+
+    def remember_etag(key: str, etag: str, path: str) -> None:
+        fresh_etags[key] = {'etag': etag, 'path': path}
+
+    downloads = []
     for url in urls:
         # Extract filename from URL
         try:
@@ -1067,21 +1141,38 @@ def download_github_attachments(
             logger.warning(f"Error parsing URL {url}: {e}")
             continue
 
-        metadata = {
-            'source': 'github',
-            'repo': repo,
-            'issue_number': issue_number,
+        key = f"{filename_prefix} {url}"
+        download = {
+            'url': url,
+            'target_dir': target_dir,
+            'filename_prefix': filename_prefix,
+            'original_filename': filename,
+            'headers': headers,
+            'metadata': metadata,
+            'on_etag': functools.partial(remember_etag, key),
         }
-
-        path, error = downloader.download_file(
-            url=url,
-            target_dir=target_dir,
-            filename_prefix=f"issue_{issue_number}",
-            original_filename=filename,
-            headers=headers,
-            metadata=metadata
-        )
-
+        cached = etags.get(key)
+        if (
+            isinstance(cached, dict)
+            and cached.get('etag')
+            and cached.get('path')
+            and Path(cached['path']).parent == target_dir
+            and os.path.isfile(cached['path'])
+        ):
+            download['cached'] = (cached['etag'], cached['path'])
+        downloads.append(download)
+
+    results = downloader.download_many(downloads, max_workers=max_workers)
+
+    # One cache write per batch; refreshed entries move to the newest end
+    if fresh_etags:
+        for key, entry in fresh_etags.items():
+            etags.pop(key, None)
+            etags[key] = entry
+        _save_attachment_etags(cache_path, etags)
+
+    for download, (path, error) in zip(downloads, results):
+        url, filename = download['url'], download['original_filename']
         if path:
             downloaded_paths.append(path)
             logger.info(f"Downloaded GitHub attachment: {filename}")
@@ -1992,6 +2083,9 @@ def handle_fetch(args: argparse.Namespace) -> int:
             time.sleep(check_interval)
 
     # Shutdown
+    if downloader:
+        # Release the pooled keep-alive connections shared by all downloads
+        downloader.close()
     logger.info("-" * 70)
     logger.info("Summary:")
     logger.info(f"  New issues processed: {total_processed}")
@@ -831,6 +831,9 @@ def main_loop(args: argparse.Namespace) -> int:
             time.sleep(check_interval)
 
     # Shutdown
+    if downloader:
+        # Release the pooled keep-alive connections shared by all downloads
+        downloader.close()
     logger.info("-" * 70)
     logger.info(f"Shutting down. Created {total_processed} kanban tasks.")
     logger.info(f"Total processed messages: {state_mgr.get_message_count()}")
@@ -35,7 +35,7 @@ import json
 import logging
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Dict, List, Optional, Any
+from typing import Dict, Iterable, List, Optional, Tuple, Any
 
 logger = logging.getLogger(__name__)
 
@@ -143,24 +143,14 @@ class SlackStateManager:
             logger.debug(f"Duplicate message ts={message_ts}, skipping")
             return False
 
-        # Build state entry
-        entry = {
-            'ts': message_ts,
-            'task_id': task_id,
-            'processed_at': datetime.now(timezone.utc).isoformat(),
-            **message_data
-        }
+        entry = self._build_entry(message_ts, task_id, message_data)
 
         try:
             # Append to file (atomic)
             with open(self.state_file, 'a', encoding='utf-8') as f:
                 f.write(json.dumps(entry, ensure_ascii=False) + '\n')
 
-            # Update in-memory state
-            self.messages.append(entry)
-            self.message_ts_set.add(message_ts)
-            if not self.last_ts or message_ts > self.last_ts:
-                self.last_ts = message_ts
+            self._remember(entry)
 
             logger.debug(f"Recorded message ts={message_ts} -> task_id={task_id}")
             return True
@@ -169,6 +159,69 @@ class SlackStateManager:
             logger.error(f"Error appending to {self.state_file}: {e}")
             return False
 
+    def mark_processed_many(
+        self,
+        items: Iterable[Tuple[str, str, Dict[str, Any]]]
+    ) -> int:
+        """
+        Mark several messages as processed with a single append to the state file.
+
+        Args:
+            items: (message_ts, task_id, message_data) tuples, as passed to mark_processed
+
+        Returns:
+            Number of new messages recorded (duplicates are skipped)
+        """
+        entries = []
+        seen = set()
+        for message_ts, task_id, message_data in items:
+            if message_ts in self.message_ts_set or message_ts in seen:
+                logger.debug(f"Duplicate message ts={message_ts}, skipping")
+                continue
+            seen.add(message_ts)
+            entries.append(self._build_entry(message_ts, task_id, message_data))
+
+        if not entries:
+            return 0
+
+        try:
+            with open(self.state_file, 'a', encoding='utf-8') as f:
+                f.write(''.join(
+                    json.dumps(entry, ensure_ascii=False) + '\n' for entry in entries
+                ))
+
+            for entry in entries:
+                self._remember(entry)
+
+            logger.debug(f"Recorded {len(entries)} messages in one batch")
+            return len(entries)
+
+        except Exception as e:
+            logger.error(f"Error appending to {self.state_file}: {e}")
+            return 0
+
+    @staticmethod
+    def _build_entry(
+        message_ts: str,
+        task_id: str,
+        message_data: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Build the state entry written for a processed message."""
+        return {
+            'ts': message_ts,
+            'task_id': task_id,
+            'processed_at': datetime.now(timezone.utc).isoformat(),
+            **message_data
+        }
+
+    def _remember(self, entry: Dict[str, Any]) -> None:
+        """Update in-memory state with an entry already written to disk."""
+        message_ts = entry['ts']
+        self.messages.append(entry)
+        self.message_ts_set.add(message_ts)
+        if not self.last_ts or message_ts > self.last_ts:
+            self.last_ts = message_ts
+
     def get_task_id_for_message(self, message_ts: str) -> Optional[str]:
         """
         Get the kanban task ID for a given message.
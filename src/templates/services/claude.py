@@ -9,9 +9,40 @@ import json
 import os
 import subprocess
 import sys
-from datetime import datetime
+import time
 from pathlib import Path
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple, Union
+
+# Optional fast JSON parser for the stream-json events claude emits one per line
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+# [epoch_second, formatted] for the most recent pretty-output timestamp
+_TIMESTAMP_CACHE = [-1, ""]
+
+
+def _timestamp() -> str:
+    """Return local time as 'HH:MM:SS AM', formatted at most once per second."""
+    now = int(time.time())
+    if now != _TIMESTAMP_CACHE[0]:
+        _TIMESTAMP_CACHE[0] = now
+        _TIMESTAMP_CACHE[1] = time.strftime("%I:%M:%S %p", time.localtime(now))
+    return _TIMESTAMP_CACHE[1]
+
+
+def _json_loads(text: str) -> Any:
+    """Parse JSON with orjson when available, deferring to json for anything it rejects."""
+    if ORJSON_AVAILABLE and text[:1] == "{":
+        try:
+            return orjson.loads(text)
+        except orjson.JSONDecodeError:
+            # e.g. NaN or oversized integers, which json accepts; let it decide
+            pass
+    return json.loads(text)
 
 
 class ClaudeService:
@@ -318,7 +349,7 @@ Environment Variables:
 
         return cmd
 
-    def pretty_format_json(self, json_line: str) -> Optional[str]:
+    def pretty_format_json(self, json_line: str) -> Optional[Union[str, Tuple[str, str, str]]]:
         """
         Format JSON line for pretty output.
         For type=assistant: show datetime, message content, and counter
@@ -332,246 +363,259 @@ Environment Variables:
         the output shows the JSON metadata on one line, then the actual content/result
         value is printed below with newlines properly rendered (similar to jq -r or @text).
         This keeps JSON structure compact while making multi-line strings readable.
+        Such output is returned as a (metadata_json, label, value) tuple that is written
+        part by part, so large values are never copied into one concatenated string.
 
         USER MESSAGE TRUNCATION: User messages are truncated based on CLAUDE_USER_MESSAGE_PRETTY_TRUNCATE
         environment variable (default: 4 lines, -1: no truncation). When truncated, a [Truncated...]
         indicator is added. This only applies to user messages in pretty mode.
         """
         try:
-            data = json.loads(json_line)
-            self.message_counter += 1
+            data = _json_loads(json_line)
+            # Count in a local and format the '#N' label once for every field that shows it
+            message_counter = self.message_counter + 1
+            self.message_counter = message_counter
+            counter = f"#{message_counter}"
 
             # Get current datetime in readable format
-            now = datetime.now().strftime("%I:%M:%S %p")
-
-            # For user messages, show simplified output with truncation
-            if data.get("type") == "user":
-                message = data.get("message", {})
-                content_list = message.get("content", [])
-
-                # Extract text content
-                text_content = ""
-                for item in content_list:
-                    if isinstance(item, dict) and item.get("type") == "text":
-                        text_content = item.get("text", "")
-                        break
-
-                # Apply truncation for user messages based on CLAUDE_USER_MESSAGE_PRETTY_TRUNCATE
-                # -1 means no truncation, otherwise truncate to N lines
-                if self.user_message_truncate != -1:
-                    lines = text_content.split('\n')
-                    if len(lines) > self.user_message_truncate:
-                        # Truncate to N lines and add indicator
-                        text_content = '\n'.join(lines[:self.user_message_truncate]) + '\n[Truncated...]'
-
-                # Create simplified output with datetime, content, and counter
-                simplified = {
-                    "type": "user",
-                    "datetime": now,
-                    "counter": f"#{self.message_counter}"
+            now = _timestamp()
+
+            # One dict lookup picks the formatter for the event type
+            event_type = data.get("type")
+            formatter = (
+                self._PRETTY_FORMATTERS.get(event_type, ClaudeService._format_other_event)
+                if isinstance(event_type, str)
+                else ClaudeService._format_other_event
+            )
+            return formatter(self, data, now, counter)
+
+        except json.JSONDecodeError:
+            # If not valid JSON, return as-is
+            return json_line
+        except Exception as e:
+            # On any error, return original line
+            print(f"Warning: Error formatting JSON: {e}", file=sys.stderr)
+            return json_line
+
+    def _format_user_event(self, data: Dict[str, Any], now: str, counter: str) -> Union[str, Tuple[str, str, str]]:
+        """Format a user message: datetime, content (truncated) and counter."""
+        message = data.get("message", {})
+        content_list = message.get("content", [])
+
+        # Extract text content from the first text item
+        text_content = next(
+            (item.get("text", "") for item in content_list
+             if isinstance(item, dict) and item.get("type") == "text"),
+            ""
+        )
+
+        # Apply truncation for user messages based on CLAUDE_USER_MESSAGE_PRETTY_TRUNCATE
+        # -1 means no truncation, otherwise truncate to N lines
+        # Only the first N+1 lines are split off; the rest of a long message is left alone
+        if self.user_message_truncate != -1:
+            lines = text_content.split('\n', self.user_message_truncate)
+            if len(lines) > self.user_message_truncate:
+                # Truncate to N lines and add indicator
+                text_content = '\n'.join(lines[:self.user_message_truncate]) + '\n[Truncated...]'
+
+        # Create simplified output with datetime, content, and counter
+        simplified = {
+            "type": "user",
+            "datetime": now,
+            "counter": counter
+        }
+
+        # Check if content has newlines after potential truncation
+        if '\n' in text_content:
+            # Multi-line content: print JSON metadata, then raw content
+            metadata = {
+                "type": "user",
+                "datetime": now,
+                "counter": counter
+            }
+            # Metadata as compact JSON on first line, then content label and raw multi-line text
+            return (json.dumps(metadata, ensure_ascii=False), "\ncontent:\n", text_content)
+        else:
+            # Single-line content: normal JSON
+            simplified["content"] = text_content
+            return json.dumps(simplified, ensure_ascii=False)
+
+    def _format_progress_event(self, data: Dict[str, Any], now: str, counter: str) -> Optional[Union[str, Tuple[str, str, str]]]:
+        """Format a progress event: bash_progress gets a [Progress] tag, hook_progress is skipped."""
+        progress_data = data.get("data", {})
+        progress_type = progress_data.get("type", "")
+
+        # Skip hook_progress events (not interested)
+        if progress_type == "hook_progress":
+            return None
+
+        # Display bash_progress events with [Progress] tag
+        if progress_type == "bash_progress":
+            # Extract relevant fields from bash_progress
+            output_text = progress_data.get("output", "")
+            elapsed_time = progress_data.get("elapsedTimeSeconds", 0)
+            total_lines = progress_data.get("totalLines", 0)
+
+            # Create simplified output with datetime and counter
+            simplified = {
+                "type": "progress",
+                "progress_type": "bash_progress",
+                "datetime": now,
+                "counter": counter,
+                "elapsed": f"{elapsed_time}s",
+                "lines": total_lines
+            }
+
+            # Check if output has newlines
+            if '\n' in output_text:
+                # Multi-line output: print metadata, then raw output
+                return (json.dumps(simplified, ensure_ascii=False), "\n[Progress] output:\n", output_text)
+            else:
+                # Single-line output: normal JSON with [Progress] tag
+                simplified["output"] = output_text
+                # Add [Progress] tag to the output
+                output_json = json.dumps(simplified, ensure_ascii=False)
+                return f"[Progress] {output_json}"
+
+        # For other progress types, display with datetime and counter
+        simplified = {
+            "type": "progress",
+            "progress_type": progress_type,
+            "datetime": now,
+            "counter": counter,
+            "data": progress_data
+        }
+        return json.dumps(simplified, ensure_ascii=False)
+
+    def _format_assistant_event(self, data: Dict[str, Any], now: str, counter: str) -> Union[str, Tuple[str, str, str]]:
+        """Format an assistant message: datetime, content or tool_use, and counter."""
+        message = data.get("message", {})
+        content_list = message.get("content", [])
+
+        # Extract text content or tool_use from the first item carrying either
+        text_content = ""
+        tool_use_data = None
+
+        first_item = next(
+            (item for item in content_list
+             if isinstance(item, dict) and item.get("type") in ("text", "tool_use")),
+            None
+        )
+        if first_item is not None:
+            if first_item["type"] == "text":
+                text_content = first_item.get("text", "")
+            else:
+                # Extract tool name and input for tool_use
+                tool_use_data = {
+                    "name": first_item.get("name", ""),
+                    "input": first_item.get("input", {})
                 }
 
-                # Check if content has newlines after potential truncation
-                if '\n' in text_content:
-                    # Multi-line content: print JSON metadata, then raw content
-                    metadata = {
-                        "type": "user",
-                        "datetime": now,
-                        "counter": f"#{self.message_counter}"
-                    }
-                    # Print metadata as compact JSON on first line
-                    output = json.dumps(metadata, ensure_ascii=False)
-                    # Then print content label and raw multi-line text
-                    output += "\ncontent:\n" + text_content
-                    return output
-                else:
-                    # Single-line content: normal JSON
-                    simplified["content"] = text_content
-                    return json.dumps(simplified, ensure_ascii=False)
-
-            # For progress events, handle bash_progress and skip hook_progress
-            elif data.get("type") == "progress":
-                progress_data = data.get("data", {})
-                progress_type = progress_data.get("type", "")
-
-                # Skip hook_progress events (not interested)
-                if progress_type == "hook_progress":
-                    return None
-
-                # Display bash_progress events with [Progress] tag
-                if progress_type == "bash_progress":
-                    # Extract relevant fields from bash_progress
-                    output_text = progress_data.get("output", "")
-                    elapsed_time = progress_data.get("elapsedTimeSeconds", 0)
-                    total_lines = progress_data.get("totalLines", 0)
-
-                    # Create simplified output with datetime and counter
-                    simplified = {
-                        "type": "progress",
-                        "progress_type": "bash_progress",
-                        "datetime": now,
-                        "counter": f"#{self.message_counter}",
-                        "elapsed": f"{elapsed_time}s",
-                        "lines": total_lines
-                    }
-
-                    # Check if output has newlines
-                    if '\n' in output_text:
-                        # Multi-line output: print metadata, then raw output
-                        metadata_json = json.dumps(simplified, ensure_ascii=False)
-                        return metadata_json + "\n[Progress] output:\n" + output_text
-                    else:
-                        # Single-line output: normal JSON with [Progress] tag
-                        simplified["output"] = output_text
-                        # Add [Progress] tag to the output
-                        output_json = json.dumps(simplified, ensure_ascii=False)
-                        return f"[Progress] {output_json}"
-
-                # For other progress types, display with datetime and counter
-                simplified = {
-                    "type": "progress",
-                    "progress_type": progress_type,
-                    "datetime": now,
-                    "counter": f"#{self.message_counter}",
-                    "data": progress_data
+        # Create simplified output with datetime, content/tool_use, and counter
+        # KEEP the 'type' field for shell backend compatibility
+        simplified = {
+            "type": "assistant",
+            "datetime": now,
+            "counter": counter
+        }
+
+        # Add either content or tool_use data
+        if tool_use_data:
+            # Check if prompt field in tool_use.input has multi-line content
+            tool_input = tool_use_data.get("input", {})
+            prompt_field = tool_input.get("prompt", "")
+
+            if isinstance(prompt_field, str) and '\n' in prompt_field:
+                # Multi-line prompt: extract it and render separately
+                # Create a copy of tool_use_data with prompt removed
+                tool_use_copy = {
+                    "name": tool_use_data.get("name", ""),
+                    "input": {k: v for k, v in tool_input.items() if k != "prompt"}
                 }
-                return json.dumps(simplified, ensure_ascii=False)
 
-            # For assistant messages, show simplified output
-            elif data.get("type") == "assistant":
-                message = data.get("message", {})
-                content_list = message.get("content", [])
-
-                # Extract text content or tool_use from content array
-                text_content = ""
-                tool_use_data = None
-
-                for item in content_list:
-                    if isinstance(item, dict):
-                        if item.get("type") == "text":
-                            text_content = item.get("text", "")
-                            break
-                        elif item.get("type") == "tool_use":
-                            # Extract tool name and input for tool_use
-                            tool_use_data = {
-                                "name": item.get("name", ""),
-                                "input": item.get("input", {})
-                            }
-                            break
-
-                # Create simplified output with datetime, content/tool_use, and counter
-                # KEEP the 'type' field for shell backend compatibility
-                simplified = {
+                simplified["tool_use"] = tool_use_copy
+
+                # Metadata as compact JSON on first line, then prompt label and raw multi-line text
+                return (json.dumps(simplified, ensure_ascii=False), "\nprompt:\n", prompt_field)
+            else:
+                # No multi-line prompt: normal JSON output for tool_use
+                simplified["tool_use"] = tool_use_data
+                return json.dumps(simplified, ensure_ascii=False)
+        else:
+            # For content, check if it has newlines
+            if '\n' in text_content:
+                # Multi-line content: print JSON metadata, then raw content
+                metadata = {
                     "type": "assistant",
                     "datetime": now,
-                    "counter": f"#{self.message_counter}"
+                    "counter": counter
                 }
-
-                # Add either content or tool_use data
-                if tool_use_data:
-                    # Check if prompt field in tool_use.input has multi-line content
-                    tool_input = tool_use_data.get("input", {})
-                    prompt_field = tool_input.get("prompt", "")
-
-                    if isinstance(prompt_field, str) and '\n' in prompt_field:
-                        # Multi-line prompt: extract it and render separately
-                        # Create a copy of tool_use_data with prompt removed
-                        tool_use_copy = {
-                            "name": tool_use_data.get("name", ""),
-                            "input": {k: v for k, v in tool_input.items() if k != "prompt"}
-                        }
-
-                        simplified["tool_use"] = tool_use_copy
-
-                        # Print metadata as compact JSON on first line
-                        output = json.dumps(simplified, ensure_ascii=False)
-                        # Then print prompt label and raw multi-line text
-                        output += "\nprompt:\n" + prompt_field
-                        return output
-                    else:
-                        # No multi-line prompt: normal JSON output for tool_use
-                        simplified["tool_use"] = tool_use_data
-                        return json.dumps(simplified, ensure_ascii=False)
-                else:
-                    # For content, check if it has newlines
-                    if '\n' in text_content:
-                        # Multi-line content: print JSON metadata, then raw content
-                        metadata = {
-                            "type": "assistant",
-                            "datetime": now,
-                            "counter": f"#{self.message_counter}"
-                        }
-                        # Print metadata as compact JSON on first line
-                        output = json.dumps(metadata, ensure_ascii=False)
-                        # Then print content label and raw multi-line text
-                        output += "\ncontent:\n" + text_content
-                        return output
-                    else:
-                        # Single-line content: normal JSON
-                        simplified["content"] = text_content
-                        return json.dumps(simplified, ensure_ascii=False)
+                # Metadata as compact JSON on first line, then content label and raw multi-line text
+                return (json.dumps(metadata, ensure_ascii=False), "\ncontent:\n", text_content)
             else:
-                # For other message types, check if there's nested content to flatten
-                message = data.get("message", {})
-                content_list = message.get("content", [])
-
-                # Check if this is a message with nested tool_result or similar content
-                if content_list and isinstance(content_list, list) and len(content_list) > 0:
-                    nested_item = content_list[0]
-                    if isinstance(nested_item, dict) and nested_item.get("type") in ["tool_result"]:
-                        # Flatten the nested structure by pulling nested fields to top level
-                        flattened = {
-                            "datetime": now,
-                            "counter": f"#{self.message_counter}",
-                        }
-
-                        # Add tool_use_id if present
-                        if "tool_use_id" in nested_item:
-                            flattened["tool_use_id"] = nested_item["tool_use_id"]
-
-                        # Add type from nested item
-                        flattened["type"] = nested_item["type"]
-
-                        # Handle content field with multiline support
-                        nested_content = nested_item.get("content", "")
-                        if isinstance(nested_content, str) and '\n' in nested_content:
-                            # Multi-line content: separate metadata from content
-                            # Print metadata as compact JSON
-                            metadata_json = json.dumps(flattened, ensure_ascii=False)
-                            # Then print content label and raw multi-line text
-                            return metadata_json + "\ncontent:\n" + nested_content
-                        else:
-                            # Single-line content: normal JSON
-                            flattened["content"] = nested_content
-                            return json.dumps(flattened, ensure_ascii=False)
-
-                # For other message types, show full message with datetime and counter
-                # Type field is already present in data, so it's preserved
-                output = {
+                # Single-line content: normal JSON
+                simplified["content"] = text_content
+                return json.dumps(simplified, ensure_ascii=False)
+
+    def _format_other_event(self, data: Dict[str, Any], now: str, counter: str) -> Union[str, Tuple[str, str, str]]:
+        """Format any other event: flattened tool_result, or the full message with datetime and counter."""
+        # For other message types, check if there's nested content to flatten
+        message = data.get("message", {})
+        content_list = message.get("content", [])
+
+        # Check if this is a message with nested tool_result or similar content
+        if content_list and isinstance(content_list, list) and len(content_list) > 0:
+            nested_item = content_list[0]
+            if isinstance(nested_item, dict) and nested_item.get("type") in ["tool_result"]:
+                # Flatten the nested structure by pulling nested fields to top level
+                flattened = {
                     "datetime": now,
-                    "counter": f"#{self.message_counter}",
-                    **data
+                    "counter": counter,
                 }
 
-                # Check if 'result' field has multi-line content
-                if "result" in output and isinstance(output["result"], str) and '\n' in output["result"]:
-                    # Multi-line result: separate metadata from content
-                    result_value = output.pop("result")
-                    # Print metadata as compact JSON
-                    metadata_json = json.dumps(output, ensure_ascii=False)
-                    # Then print result label and raw multi-line text
-                    return metadata_json + "\nresult:\n" + result_value
-                else:
-                    # Normal JSON output
-                    return json.dumps(output, ensure_ascii=False)
+                # Add tool_use_id if present
+                if "tool_use_id" in nested_item:
+                    flattened["tool_use_id"] = nested_item["tool_use_id"]
 
-        except json.JSONDecodeError:
-            # If not valid JSON, return as-is
-            return json_line
-        except Exception as e:
-            # On any error, return original line
-            print(f"Warning: Error formatting JSON: {e}", file=sys.stderr)
-            return json_line
+                # Add type from nested item
+                flattened["type"] = nested_item["type"]
+
+                # Handle content field with multiline support
+                nested_content = nested_item.get("content", "")
+                if isinstance(nested_content, str) and '\n' in nested_content:
+                    # Multi-line content: separate metadata from content
+                    # Metadata as compact JSON, then content label and raw multi-line text
+                    return (json.dumps(flattened, ensure_ascii=False), "\ncontent:\n", nested_content)
+                else:
+                    # Single-line content: normal JSON
+                    flattened["content"] = nested_content
+                    return json.dumps(flattened, ensure_ascii=False)
+
+        # For other message types, show full message with datetime and counter
+        # Type field is already present in data, so it's preserved
+        output = {
+            "datetime": now,
+            "counter": counter,
+            **data
+        }
+
+        # Check if 'result' field has multi-line content
+        result_value = output.get("result")
+        if isinstance(result_value, str) and '\n' in result_value:
+            # Multi-line result: separate metadata from content
+            del output["result"]
+            # Metadata as compact JSON, then result label and raw multi-line text
+            return (json.dumps(output, ensure_ascii=False), "\nresult:\n", result_value)
+        else:
+            # Normal JSON output
+            return json.dumps(output, ensure_ascii=False)
+
+    # Event type -> formatter; anything not listed goes to _format_other_event
+    _PRETTY_FORMATTERS = {
+        "user": _format_user_event,
+        "progress": _format_progress_event,
+        "assistant": _format_assistant_event,
+    }
 
     def run_claude(self, cmd: List[str], verbose: bool = False, pretty: bool = True) -> int:
         """Execute the claude command and stream output"""
@@ -616,7 +660,7 @@ Environment Variables:
                     raw_line = line.strip()
                     # Capture the raw final result event for programmatic consumption
                     try:
-                        parsed_raw = json.loads(raw_line)
+                        parsed_raw = _json_loads(raw_line)
                         if isinstance(parsed_raw, dict) and parsed_raw.get("type") == "result":
                             self.last_result_event = parsed_raw
                     except json.JSONDecodeError:
@@ -626,7 +670,12 @@ Environment Variables:
                     # Apply pretty formatting if enabled
                     if pretty:
                         formatted_line = self.pretty_format_json(raw_line)
-                        if formatted_line:
+                        if isinstance(formatted_line, tuple):
+                            # Multi-line output: write the parts without joining them
+                            sys.stdout.writelines(formatted_line)
+                            sys.stdout.write("\n")
+                            sys.stdout.flush()
+                        elif formatted_line:
                             print(formatted_line, flush=True)
                     else:
                         # Raw output without formatting
@@ -5,12 +5,37 @@ This script provides a wrapper around OpenAI Codex CLI with configurable options
 """
 
 import argparse
+import codecs
+import functools
 import os
+import re
+import selectors
+import shutil
 import subprocess
 import sys
 import json
-from datetime import datetime
-from typing import List, Optional
+import time
+from typing import List, Optional, Tuple, Union
+
+# Optional fast JSON parser for the common one-object-per-line case
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+# [epoch_second, formatted] for the most recent pretty-header timestamp
+_TIMESTAMP_CACHE = [-1, ""]
+
+
+def _timestamp() -> str:
+    """Return local time as 'HH:MM:SS AM', formatted at most once per second."""
+    now = int(time.time())
+    if now != _TIMESTAMP_CACHE[0]:
+        _TIMESTAMP_CACHE[0] = now
+        _TIMESTAMP_CACHE[1] = time.strftime("%I:%M:%S %p", time.localtime(now))
+    return _TIMESTAMP_CACHE[1]
 
 
 class CodexService:
@@ -19,6 +44,16 @@ class CodexService:
     # Default configuration
     DEFAULT_MODEL = "gpt-5.3-codex"
     DEFAULT_AUTO_INSTRUCTION = """You are an AI coding assistant. Follow the instructions provided and generate high-quality code."""
+    _DEFAULT_PROMPT_PREFIX = DEFAULT_AUTO_INSTRUCTION + "\n\n"
+
+    # Config arguments passed to codex unless overridden with -c
+    DEFAULT_CONFIGS = (
+        "include_apply_patch_tool=true",
+        "use_experimental_streamable_shell_tool=true",
+        "sandbox_mode=danger-full-access",
+    )
+    _DEFAULT_CONFIGS_BY_KEY = {c.partition("=")[0]: c for c in DEFAULT_CONFIGS}
+    _DEFAULT_CONFIG_ARGS = tuple(part for c in DEFAULT_CONFIGS for part in ("-c", c))
 
     # Model shorthand mappings (colon-prefixed names expand to full model IDs)
     MODEL_SHORTHANDS = {
@@ -28,6 +63,49 @@ class CodexService:
         ":mini": "gpt-5-codex-mini",
     }
 
+    # Streaming msg types hidden by default (extended via CODEX_HIDE_STREAM_TYPES)
+    DEFAULT_HIDDEN_STREAM_TYPES = frozenset({"turn_diff", "token_count", "exec_command_output_delta"})
+
+    # Raw-text fallback for the default hidden types when a chunk is not parseable
+    # JSON; codex emits lowercase type names, so no case folding is needed
+    _SUPPRESSED_TEXT_RE = re.compile(
+        '"(?:%s)"' % "|".join(map(re.escape, sorted(DEFAULT_HIDDEN_STREAM_TYPES)))
+    )
+
+    # Leading type field of a default hidden event, used to drop such lines
+    # unparsed. Only the event's own type counts: the first key of the line's
+    # object, or of its msg payload (optionally after a plain string id)
+    _HIDDEN_EVENT_PREFIX_RE = re.compile(
+        r'\{\s*(?P<msg>(?:"id"\s*:\s*"[^"\\]*"\s*,\s*)?"msg"\s*:\s*\{\s*)?'
+        r'"type"\s*:\s*"(?:%s)"' % "|".join(map(re.escape, sorted(DEFAULT_HIDDEN_STREAM_TYPES)))
+    )
+
+    # msg types that _format_msg_pretty has a dedicated branch for
+    _PRETTY_MSG_TYPES = frozenset({
+        "agent_reasoning", "reasoning",
+        "agent_message", "message", "assistant_message", "assistant",
+        "exec_command_end",
+        "command_execution",
+    })
+
+    # C-accelerated decoder used to pull objects out of the raw stream; non-strict
+    # so raw control characters inside command output strings still parse
+    _JSON_DECODER = json.JSONDecoder(strict=False)
+
+    # Characters that affect brace depth while an object spans several lines
+    _STRUCTURE_RE = re.compile(r'[{}"\\]')
+
+    # Fixed per-instance state; class-level constants above are unaffected
+    __slots__ = (
+        "model_name",
+        "auto_instruction",
+        "project_path",
+        "prompt",
+        "additional_args",
+        "verbose",
+        "_item_counter",
+    )
+
     def __init__(self):
         self.model_name = self.DEFAULT_MODEL
         self.auto_instruction = self.DEFAULT_AUTO_INSTRUCTION
@@ -48,21 +126,25 @@ class CodexService:
             return self.MODEL_SHORTHANDS.get(model, model)
         return model
 
+    @staticmethod
+    @functools.lru_cache(maxsize=1)
+    def _codex_path() -> Optional[str]:
+        """Resolve the codex executable on PATH once per process."""
+        return shutil.which("codex")
+
     def check_codex_installed(self) -> bool:
         """Check if codex CLI is installed and available"""
-        try:
-            result = subprocess.run(
-                ["which", "codex"],
-                capture_output=True,
-                text=True,
-                check=False
-            )
-            return result.returncode == 0
-        except Exception:
-            return False
+        return self._codex_path() is not None
 
-    def parse_arguments(self) -> argparse.Namespace:
-        """Parse command line arguments"""
+    @classmethod
+    @functools.lru_cache(maxsize=1)
+    def _argument_parser(cls) -> argparse.ArgumentParser:
+        """
+        Build the argument parser once per process.
+
+        Defaults that depend on the environment (--cd, --model) are left as
+        None here and resolved in parse_arguments on every call.
+        """
         parser = argparse.ArgumentParser(
             description="Codex Service - Wrapper for OpenAI Codex CLI",
             formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -72,6 +154,7 @@ Examples:
   %(prog)s -pp prompt.txt --cd /path/to/project
   %(prog)s -p "Add tests" -m gpt-4 -c custom_arg=value
   %(prog)s -p "Optimize code" -m :codex  # uses gpt-5.3-codex
+  %(prog)s -p "Fix lint errors" --raw     # unfiltered codex output
 
 Environment Variables:
   CODEX_MODEL                Model name (supports shorthand, default: gpt-5.3-codex)
@@ -97,21 +180,21 @@ Environment Variables:
         parser.add_argument(
             "--cd",
             type=str,
-            default=os.getcwd(),
+            default=None,
             help="Project path (absolute path). Default: current directory"
         )
 
         parser.add_argument(
             "-m", "--model",
             type=str,
-            default=os.environ.get("CODEX_MODEL", self.DEFAULT_MODEL),
-            help=f"Model name. Supports shorthand (e.g., ':codex', ':gpt-5', ':mini') or full model ID. Default: {self.DEFAULT_MODEL} (env: CODEX_MODEL)"
+            default=None,
+            help=f"Model name. Supports shorthand (e.g., ':codex', ':gpt-5', ':mini') or full model ID. Default: {cls.DEFAULT_MODEL} (env: CODEX_MODEL)"
         )
 
         parser.add_argument(
             "--auto-instruction",
             type=str,
-            default=self.DEFAULT_AUTO_INSTRUCTION,
+            default=cls.DEFAULT_AUTO_INSTRUCTION,
             help="Auto instruction to prepend to prompt"
         )
 
@@ -128,13 +211,31 @@ Environment Variables:
             help="Enable verbose output"
         )
 
-        return parser.parse_args()
+        parser.add_argument(
+            "--raw",
+            action="store_true",
+            help="Pass codex output through unfiltered (replaces this process with codex)"
+        )
+
+        return parser
 
-    def _first_nonempty_str(self, *values: Optional[str]) -> str:
-        """Return the first non-empty string value."""
-        for val in values:
-            if isinstance(val, str) and val != "":
-                return val
+    def parse_arguments(self) -> argparse.Namespace:
+        """Parse command line arguments"""
+        args = self._argument_parser().parse_args()
+        if args.cd is None:
+            args.cd = os.getcwd()
+        if args.model is None:
+            args.model = os.environ.get("CODEX_MODEL", self.DEFAULT_MODEL)
+        return args
+
+    def _first_str_value(self, source: Optional[dict], keys: Tuple[str, ...]) -> str:
+        """Return the first non-empty string among source[key] for keys, looked up lazily."""
+        if not isinstance(source, dict):
+            return ""
+        for key in keys:
+            value = source.get(key)
+            if isinstance(value, str) and value:
+                return value
         return ""
 
     def _extract_content_text(self, payload: dict) -> str:
@@ -159,48 +260,39 @@ Environment Variables:
         """Extract aggregated/command output from various item.* layouts."""
         if not isinstance(payload, dict):
             return ""
-        result = payload.get("result") if isinstance(payload.get("result"), dict) else None
-        content_text = self._extract_content_text(payload)
-        return self._first_nonempty_str(
-            payload.get("aggregated_output"),
-            payload.get("output"),
-            payload.get("formatted_output"),
-            result.get("aggregated_output") if result else None,
-            result.get("output") if result else None,
-            result.get("formatted_output") if result else None,
-            content_text,
+        # Each source is only consulted when every earlier one came up empty
+        keys = ("aggregated_output", "output", "formatted_output")
+        return (
+            self._first_str_value(payload, keys)
+            or self._first_str_value(payload.get("result"), keys)
+            or self._extract_content_text(payload)
         )
 
     def _extract_reasoning_text(self, payload: dict) -> str:
         """Extract reasoning text from legacy and item.* schemas."""
         if not isinstance(payload, dict):
             return ""
-        reasoning_obj = payload.get("reasoning") if isinstance(payload.get("reasoning"), dict) else None
-        result_obj = payload.get("result") if isinstance(payload.get("result"), dict) else None
-        content_text = self._extract_content_text(payload)
-        return self._first_nonempty_str(
-            payload.get("text"),
-            payload.get("reasoning_text"),
-            reasoning_obj.get("text") if reasoning_obj else None,
-            result_obj.get("text") if result_obj else None,
-            content_text,
+        return (
+            self._first_str_value(payload, ("text", "reasoning_text"))
+            or self._first_str_value(payload.get("reasoning"), ("text",))
+            or self._first_str_value(payload.get("result"), ("text",))
+            or self._extract_content_text(payload)
         )
 
     def _extract_message_text(self, payload: dict) -> str:
         """Extract final/assistant message text from item.* schemas."""
         if not isinstance(payload, dict):
             return ""
-        result_obj = payload.get("result") if isinstance(payload.get("result"), dict) else None
-        content_text = self._extract_content_text(payload)
-        return self._first_nonempty_str(
-            payload.get("message"),
-            payload.get("text"),
-            payload.get("final"),
-            result_obj.get("message") if result_obj else None,
-            result_obj.get("text") if result_obj else None,
-            content_text,
+        return (
+            self._first_str_value(payload, ("message", "text", "final"))
+            or self._first_str_value(payload.get("result"), ("message", "text"))
+            or self._extract_content_text(payload)
         )
 
+    def _is_suppressed_text(self, text: str) -> bool:
+        """Return True if unparsed text mentions a noisy stream type."""
+        return self._SUPPRESSED_TEXT_RE.search(text) is not None
+
     def _parse_item_number(self, item_id: str) -> Optional[int]:
         """Return numeric component from item_{n} ids or None if unparseable."""
         if not isinstance(item_id, str):
@@ -235,8 +327,31 @@ Environment Variables:
     def read_prompt_file(self, file_path: str) -> str:
         """Read prompt from a file"""
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return f.read().strip()
+            # Read the whole file with as few syscalls as possible and decode once
+            fd = os.open(file_path, os.O_RDONLY)
+            try:
+                size = os.fstat(fd).st_size
+                chunks = []
+                remaining = size
+                while remaining > 0:
+                    chunk = os.read(fd, remaining)
+                    if not chunk:
+                        break
+                    chunks.append(chunk)
+                    remaining -= len(chunk)
+                # Files that grew (or report size 0, e.g. pipes) are read to EOF
+                while True:
+                    chunk = os.read(fd, 65536)
+                    if not chunk:
+                        break
+                    chunks.append(chunk)
+            finally:
+                os.close(fd)
+            text = b"".join(chunks).decode("utf-8")
+            # Match text-mode universal newline handling
+            if "\r" in text:
+                text = text.replace("\r\n", "\n").replace("\r", "\n")
+            return text.strip()
         except FileNotFoundError:
             print(f"Error: Prompt file not found: {file_path}", file=sys.stderr)
             sys.exit(1)
@@ -246,53 +361,31 @@ Environment Variables:
 
     def build_codex_command(self, args: argparse.Namespace) -> List[str]:
         """Build the codex command with all arguments"""
-        # Start with base command
-        cmd = [
-            "codex",
-            "--cd", self.project_path,
-            "-m", self.model_name,
-        ]
-
-        # Add default config arguments
-        default_configs = [
-            "include_apply_patch_tool=true",
-            "use_experimental_streamable_shell_tool=true",
-            "sandbox_mode=danger-full-access"
-        ]
-
-        # Track which configs are already set
-        config_keys = set()
-        user_configs = []
-
-        # Process user-provided configs
-        if args.configs:
-            for config in args.configs:
-                key = config.split('=')[0] if '=' in config else config
-                config_keys.add(key)
-                user_configs.append(config)
-
-        # Add default configs that weren't overridden
-        for config in default_configs:
-            key = config.split('=')[0]
-            if key not in config_keys:
-                cmd.extend(["-c", config])
-
-        # Add user configs (these will override defaults if keys match)
-        for config in user_configs:
-            cmd.extend(["-c", config])
+        if not args.configs:
+            config_args = self._DEFAULT_CONFIG_ARGS
+        else:
+            # Merge configs by key in a single pass; user-provided configs
+            # override defaults that share the same key
+            merged = dict(self._DEFAULT_CONFIGS_BY_KEY)
+            merged.update({c.partition("=")[0]: c for c in args.configs})
+            config_args = [part for config in merged.values() for part in ("-c", config)]
 
         # Build the full prompt (auto_instruction + user prompt)
-        full_prompt = f"{self.auto_instruction}\n\n{self.prompt}"
-
-        # Add exec command with prompt
-        cmd.extend(["exec", full_prompt])
-
-        # Add --json flag for streaming support
-        # This is CRITICAL for codex to output streaming responses
-        # Without this flag, codex will not stream progress updates
-        cmd.append("--json")
+        if self.auto_instruction is self.DEFAULT_AUTO_INSTRUCTION:
+            full_prompt = self._DEFAULT_PROMPT_PREFIX + self.prompt
+        else:
+            full_prompt = f"{self.auto_instruction}\n\n{self.prompt}"
 
-        return cmd
+        # --json is CRITICAL for codex to output streaming responses;
+        # without this flag, codex will not stream progress updates
+        return [
+            self._codex_path() or "codex",
+            "--cd", self.project_path,
+            "-m", self.model_name,
+            *config_args,
+            "exec", full_prompt,
+            "--json",
+        ]
 
     def _format_msg_pretty(
         self,
@@ -300,7 +393,7 @@ Environment Variables:
         payload: dict,
         outer_type: str = "",
         item_id: Optional[str] = None,
-    ) -> Optional[str]:
+    ) -> Optional[Union[str, Tuple[str, str, str]]]:
         """
         Pretty format for specific msg types to be human readable while
         preserving a compact JSON header line that includes the msg.type.
@@ -311,11 +404,13 @@ Environment Variables:
         - token_count: fully suppressed (no final summary emission)
 
         Returns a string to print, or None to fall back to raw printing.
+        Multi-line blocks are returned as a (header, label, body) tuple that is
+        written part by part, so large bodies are never copied into one string.
         """
         try:
-            now = datetime.now().strftime("%I:%M:%S %p")
-            msg_type = (msg_type or "").strip()
-            header_type = (outer_type or msg_type).strip()
+            now = _timestamp()
+            msg_type = msg_type or ""
+            header_type = outer_type or msg_type
             base_type = header_type or msg_type or "message"
 
             def make_header(type_value: str):
@@ -343,7 +438,7 @@ Environment Variables:
                 content = self._extract_reasoning_text(payload)
                 header = make_header(header_type or msg_type)
                 if "\n" in content:
-                    return json.dumps(header, ensure_ascii=False) + "\ntext:\n" + content
+                    return (json.dumps(header, ensure_ascii=False), "\ntext:\n", content)
                 header["text"] = content
                 return json.dumps(header, ensure_ascii=False)
 
@@ -351,7 +446,7 @@ Environment Variables:
                 content = self._extract_message_text(payload)
                 header = make_header(header_type or msg_type)
                 if "\n" in content:
-                    return json.dumps(header, ensure_ascii=False) + "\nmessage:\n" + content
+                    return (json.dumps(header, ensure_ascii=False), "\nmessage:\n", content)
                 if content != "":
                     header["message"] = content
                     return json.dumps(header, ensure_ascii=False)
@@ -363,7 +458,7 @@ Environment Variables:
                 formatted_output = payload.get("formatted_output", "") if isinstance(payload, dict) else ""
                 header = {"type": msg_type, "datetime": now}
                 if "\n" in formatted_output:
-                    return json.dumps(header, ensure_ascii=False) + "\nformatted_output:\n" + formatted_output
+                    return (json.dumps(header, ensure_ascii=False), "\nformatted_output:\n", formatted_output)
                 header["formatted_output"] = formatted_output
                 return json.dumps(header, ensure_ascii=False)
 
@@ -371,7 +466,7 @@ Environment Variables:
             if msg_type == "command_execution":
                 aggregated_output = self._extract_command_output_text(payload)
                 if "\n" in aggregated_output:
-                    return json.dumps(header, ensure_ascii=False) + "\naggregated_output:\n" + aggregated_output
+                    return (json.dumps(header, ensure_ascii=False), "\naggregated_output:\n", aggregated_output)
                 if aggregated_output:
                     header["aggregated_output"] = aggregated_output
                     return json.dumps(header, ensure_ascii=False)
@@ -388,48 +483,140 @@ Environment Variables:
         Normalize legacy (msg-based) and new item.* schemas into a common tuple.
         Returns (msg_type, payload_dict, outer_type).
         """
-        msg = obj_dict.get("msg") if isinstance(obj_dict.get("msg"), dict) else {}
-        outer_type = (obj_dict.get("type") or "").strip()
-        item = obj_dict.get("item") if isinstance(obj_dict.get("item"), dict) else None
-
-        msg_type = (msg.get("type") or "").strip() if isinstance(msg, dict) else ""
-        payload = msg if isinstance(msg, dict) else {}
+        # codex never pads type names, so they are used without .strip()
+        outer_type = obj_dict.get("type") or ""
+
+        # Legacy schema: a typed msg payload wins outright
+        msg = obj_dict.get("msg")
+        if type(msg) is dict:
+            msg_type = msg.get("type") or ""
+            if msg_type:
+                return msg_type, msg, outer_type
+        else:
+            msg = {}
+
+        # item.* schema: fall back to the item's own type, then the outer type
+        item = obj_dict.get("item")
+        if type(item) is dict:
+            return item.get("type") or outer_type, item, outer_type
+
+        return outer_type, msg, outer_type
+
+    def _resolve_hidden_stream_types(self) -> frozenset:
+        """Merge the default hidden stream types with the ENV-configured ones."""
+        extra = [
+            part.strip()
+            for env_val in (
+                os.environ.get("CODEX_HIDE_STREAM_TYPES", ""),
+                os.environ.get("JUNO_CODE_HIDE_STREAM_TYPES", ""),
+            )
+            for part in env_val.split(",")
+            if part.strip()
+        ]
+        if not extra:
+            return self.DEFAULT_HIDDEN_STREAM_TYPES
+        return self.DEFAULT_HIDDEN_STREAM_TYPES.union(extra)
 
-        if not msg_type and item is not None:
-            msg_type = (item.get("type") or "").strip() or outer_type
-            payload = item
-        elif not msg_type:
-            msg_type = outer_type
+    def _split_json_stream(self, text: str) -> Tuple[List[Union[dict, str]], str]:
+        """
+        Extract concatenated JSON objects from text with JSONDecoder.raw_decode.
 
-        return msg_type, payload, outer_type
+        Returns (items, remainder). Items are parsed dicts in stream order, or
+        raw strings for brace-delimited chunks that are not valid JSON. The
+        remainder is a trailing object that is still incomplete and should be
+        prepended to the next line. Non-JSON noise between objects is dropped.
+        """
+        items: List[Union[dict, str]] = []
+        idx = 0
+        while True:
+            start = text.find("{", idx)
+            if start < 0:
+                return items, ""
+            try:
+                obj, idx = self._JSON_DECODER.raw_decode(text, start)
+            except json.JSONDecodeError as e:
+                # Running out of input (or inside an open string) means the
+                # object continues on a later line; anything else is malformed
+                if e.pos >= len(text.rstrip()) or e.msg.startswith("Unterminated string"):
+                    return items, text[start:]
+                # Resume at the next brace so a valid event following the
+                # malformed one on the same line is still parsed
+                idx = text.find("{", start + 1)
+                if idx < 0:
+                    idx = len(text)
+                items.append(text[start:idx].strip())
+                continue
+            items.append(obj)
+
+    def _scan_structure(
+        self, text: str, depth: int, in_str: bool, escaped: bool = False
+    ) -> Tuple[int, bool, bool]:
+        """
+        Advance JSON brace depth and string state over text.
 
-    def run_codex(self, cmd: List[str], verbose: bool = False) -> int:
+        Only quotes, braces and backslashes are visited, so the per-character
+        work happens in the regex engine. escaped carries a backslash that
+        ended the previous text inside a string. Returns the updated
+        (depth, in_str, escaped).
+        """
+        skip = 0 if escaped else -1
+        for match in self._STRUCTURE_RE.finditer(text):
+            pos = match.start()
+            if pos == skip:
+                continue
+            ch = match.group()
+            if in_str:
+                if ch == "\\":
+                    skip = pos + 1
+                elif ch == '"':
+                    in_str = False
+            elif ch == '"':
+                in_str = True
+            elif ch == "{":
+                depth += 1
+            elif ch == "}":
+                depth -= 1
+        return depth, in_str, skip == len(text)
+
+    def run_codex(self, cmd: List[str], verbose: bool = False, raw: bool = False) -> int:
         """Execute the codex command and stream output with filtering and pretty-printing
 
         Robustness improvements:
         - Attempts to parse JSON even if the line has extra prefix/suffix noise
         - Falls back to string suppression for known noisy types if JSON parsing fails
         - Never emits token_count or exec_command_output_delta even on malformed lines
+
+        With raw=True no filtering is needed, so the current process image is
+        replaced by codex and its output goes straight to the inherited stdout.
         """
         if verbose:
             print(f"Executing: {' '.join(cmd)}", file=sys.stderr)
             print("-" * 80, file=sys.stderr)
 
-        # Resolve hidden stream types (ENV configurable)
-        default_hidden = {"turn_diff", "token_count", "exec_command_output_delta"}
-        env_hide_1 = os.environ.get("CODEX_HIDE_STREAM_TYPES", "")
-        env_hide_2 = os.environ.get("JUNO_CODE_HIDE_STREAM_TYPES", "")
-        hide_types = set(default_hidden)
-        for env_val in (env_hide_1, env_hide_2):
-            if env_val:
-                parts = [p.strip() for p in env_val.split(",") if p.strip()]
-                hide_types.update(parts)
+        if raw:
+            try:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os.execvp(cmd[0], cmd)
+            except Exception as e:
+                print(f"Error executing codex: {e}", file=sys.stderr)
+                return 1
+
+        hide_types = self._resolve_hidden_stream_types()
 
         # Reset per-run item counter for synthesized ids
         self._item_counter = 0
 
-        # We fully suppress all token_count events (do not emit even at end)
-        last_token_count = None
+        # Events are written without a per-event flush; stdout is flushed once
+        # per chunk read from codex, so a burst of events costs one write syscall
+        out = sys.stdout
+
+        def emit(text: Union[str, Tuple[str, ...]], end: str = "\n"):
+            if isinstance(text, tuple):
+                out.writelines(text)
+            else:
+                out.write(text)
+            out.write(end)
 
         try:
             # Run the command and stream output
@@ -437,54 +624,10 @@ Environment Variables:
                 cmd,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
-                text=True,
-                bufsize=1,
-                universal_newlines=True
+                bufsize=0,
             )
 
-            def split_json_stream(text: str):
-                objs = []
-                buf: List[str] = []
-                depth = 0
-                in_str = False
-                esc = False
-                started = False
-                for ch in text:
-                    if in_str:
-                        buf.append(ch)
-                        if esc:
-                            esc = False
-                        elif ch == '\\':
-                            esc = True
-                        elif ch == '"':
-                            in_str = False
-                        continue
-                    if ch == '"':
-                        in_str = True
-                        buf.append(ch)
-                        continue
-                    if ch == '{':
-                        depth += 1
-                        started = True
-                        buf.append(ch)
-                        continue
-                    if ch == '}':
-                        depth -= 1
-                        buf.append(ch)
-                        if started and depth == 0:
-                            candidate = ''.join(buf).strip().strip("'\"")
-                            if candidate:
-                                objs.append(candidate)
-                            buf = []
-                            started = False
-                        continue
-                    if started:
-                        buf.append(ch)
-                remainder = ''.join(buf) if buf else ""
-                return objs, remainder
-
             def handle_obj(obj_dict: dict):
-                nonlocal last_token_count
                 msg_type_inner, payload_inner, outer_type_inner = self._normalize_event(obj_dict)
                 item_id_inner = self._normalize_item_id(payload_inner, outer_type_inner)
 
@@ -496,12 +639,21 @@ Environment Variables:
                     obj_dict["item"]["id"] = item_id_inner
 
                 if msg_type_inner == "token_count":
-                    last_token_count = obj_dict
-                    return  # suppress
+                    # Fully suppressed, not even re-emitted as a final summary,
+                    # so there is nothing to retain
+                    return
 
                 if msg_type_inner and msg_type_inner in hide_types:
                     return  # suppress
 
+                if msg_type_inner not in self._PRETTY_MSG_TYPES:
+                    # No pretty branch exists for this type; skip the formatter
+                    # and emit the normalized JSON (with any synthesized id)
+                    if item_id_inner and isinstance(payload_inner, dict) and "id" not in payload_inner:
+                        payload_inner["id"] = item_id_inner
+                    emit(json.dumps(obj_dict, ensure_ascii=False))
+                    return
+
                 pretty_line_inner = self._format_msg_pretty(
                     msg_type_inner,
                     payload_inner,
@@ -509,121 +661,152 @@ Environment Variables:
                     item_id=item_id_inner,
                 )
                 if pretty_line_inner is not None:
-                    print(pretty_line_inner, flush=True)
+                    emit(pretty_line_inner)
                 else:
                     # print normalized JSON
-                    print(json.dumps(obj_dict, ensure_ascii=False), flush=True)
-
-            pending = ""
-
-            if process.stdout:
-                for raw_line in process.stdout:
-                    combined = pending + raw_line
-                    if not combined.strip():
-                        pending = ""
-                        continue
-
-                    # If no braces present at all, treat as plain text (with suppression)
-                    if "{" not in combined and "}" not in combined:
-                        lower = combined.lower()
-                        if (
-                            '"token_count"' in lower
-                            or '"exec_command_output_delta"' in lower
-                            or '"turn_diff"' in lower
-                        ):
-                            pending = ""
-                            continue
-                        print(combined, end="" if combined.endswith("\n") else "\n", flush=True)
-                        pending = ""
-                        continue
-
-                    # Preserve and emit any prefix before the first brace
-                    first_brace = combined.find("{")
-                    if first_brace > 0:
-                        prefix = combined[:first_brace]
-                        lower_prefix = prefix.lower()
-                        if (
-                            '"token_count"' not in lower_prefix
-                            and '"exec_command_output_delta"' not in lower_prefix
-                            and '"turn_diff"' not in lower_prefix
-                            and prefix.strip()
-                        ):
-                            print(prefix, end="" if prefix.endswith("\n") else "\n", flush=True)
-                        combined = combined[first_brace:]
-
-                    parts, pending = split_json_stream(combined)
-
-                    if parts:
-                        for part in parts:
-                            try:
-                                sub = json.loads(part)
-                                if isinstance(sub, dict):
-                                    handle_obj(sub)
-                                else:
-                                    low = part.lower()
-                                    if (
-                                        '"token_count"' in low
-                                        or '"exec_command_output_delta"' in low
-                                        or '"turn_diff"' in low
-                                    ):
-                                        continue
-                                    print(part, flush=True)
-                            except Exception:
-                                low = part.lower()
-                                if (
-                                    '"token_count"' in low
-                                    or '"exec_command_output_delta"' in low
-                                    or '"turn_diff"' in low
-                                ):
-                                    continue
-                                print(part, flush=True)
-                        continue
-
-                    # No complete object found yet; keep buffering if likely in the middle of one
-                    if pending:
-                        continue
-
-                    # Fallback for malformed/non-JSON lines that still contain braces
-                    lower = combined.lower()
-                    if (
-                        '"token_count"' in lower
-                        or '"exec_command_output_delta"' in lower
-                        or '"turn_diff"' in lower
-                    ):
-                        continue
-                    print(combined, end="" if combined.endswith("\n") else "\n", flush=True)
-
-            # Flush any pending buffered content after the stream ends
-            if pending.strip():
-                try:
-                    tail_obj = json.loads(pending)
-                    if isinstance(tail_obj, dict):
-                        handle_obj(tail_obj)
-                    else:
-                        print(pending, flush=True)
-                except Exception:
-                    low_tail = pending.lower()
+                    emit(json.dumps(obj_dict, ensure_ascii=False))
+
+            # Lines of a JSON object that is still open; joined and re-parsed
+            # only once its closing brace arrives
+            pending_parts: List[str] = []
+
+            # (brace depth, inside-string flag, pending escape) of the pending
+            # object, advanced over each new line so buffered lines are never rescanned
+            pending_state = (0, False, False)
+
+            def handle_line(raw_line: str):
+                nonlocal pending_state
+                if pending_parts:
+                    pending_parts.append(raw_line)
+                    pending_state = self._scan_structure(raw_line, *pending_state)
+                    if pending_state[0] > 0:
+                        return
+                    combined = "".join(pending_parts)
+                    pending_parts.clear()
+                else:
+                    # Hidden events (notably large output deltas) are dropped unparsed.
+                    # Only when no brace opens after the type field, so the line cannot
+                    # also carry another object, and, for a top-level type, when no msg
+                    # or item payload is present whose own type would take precedence
+                    hidden = self._HIDDEN_EVENT_PREFIX_RE.match(raw_line)
                     if (
-                        '"token_count"' not in low_tail
-                        and '"exec_command_output_delta"' not in low_tail
-                        and '"turn_diff"' not in low_tail
+                        hidden
+                        and raw_line.find("{", hidden.end()) < 0
+                        and (
+                            hidden.group("msg")
+                            or ('"msg"' not in raw_line and '"item"' not in raw_line)
+                        )
                     ):
-                        print(pending, flush=True)
+                        return
+                    # NDJSON fast path: a whole line holding exactly one object
+                    if ORJSON_AVAILABLE and raw_line[:1] == "{":
+                        try:
+                            line_obj = orjson.loads(raw_line)
+                        except orjson.JSONDecodeError:
+                            line_obj = None
+                        if isinstance(line_obj, dict):
+                            handle_obj(line_obj)
+                            return
+                    combined = raw_line
+
+                if combined.isspace():
+                    return
+
+                # If no braces present at all, treat as plain text (with suppression);
+                # the brace position found here is reused for the prefix split below
+                first_brace = combined.find("{")
+                if first_brace < 0 and "}" not in combined:
+                    if not self._is_suppressed_text(combined):
+                        emit(combined, "" if combined.endswith("\n") else "\n")
+                    return
+
+                # Preserve and emit any prefix before the first brace
+                if first_brace > 0:
+                    prefix = combined[:first_brace]
+                    if not prefix.isspace() and not self._is_suppressed_text(prefix):
+                        emit(prefix, "" if prefix.endswith("\n") else "\n")
+                    combined = combined[first_brace:]
+
+                parts, remainder = self._split_json_stream(combined)
+                if remainder:
+                    pending_parts.append(remainder)
+                    pending_state = self._scan_structure(remainder, 0, False)
+
+                if parts:
+                    for part in parts:
+                        if isinstance(part, dict):
+                            handle_obj(part)
+                        elif not self._is_suppressed_text(part):
+                            emit(part)
+                    return
+
+                # No complete object found yet; keep buffering if likely in the middle of one
+                if remainder:
+                    return
+
+                # Fallback for malformed/non-JSON lines that still contain braces
+                if self._is_suppressed_text(combined):
+                    return
+                emit(combined, "" if combined.endswith("\n") else "\n")
+
+            # Drain stdout and stderr concurrently so a chatty stderr can never
+            # fill its pipe and stall codex while we block on stdout
+            stderr_chunks: List[bytes] = []
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+            line_parts: List[str] = []
+
+            with selectors.DefaultSelector() as sel:
+                sel.register(process.stdout, selectors.EVENT_READ, "stdout")
+                sel.register(process.stderr, selectors.EVENT_READ, "stderr")
+                while sel.get_map():
+                    for key, _ in sel.select():
+                        data = os.read(key.fd, 65536)
+                        if not data:
+                            sel.unregister(key.fileobj)
+                            continue
+                        if key.data == "stderr":
+                            stderr_chunks.append(data)
+                            continue
+
+                        text = decoder.decode(data)
+                        last_newline = text.rfind("\n")
+                        if last_newline < 0:
+                            line_parts.append(text)
+                            continue
+                        line_parts.append(text[:last_newline + 1])
+                        block = "".join(line_parts)
+                        line_parts = [text[last_newline + 1:]]
+                        for raw_line in block.split("\n")[:-1]:
+                            handle_line(raw_line + "\n")
+                        out.flush()
+
+            tail = "".join(line_parts) + decoder.decode(b"", final=True)
+            if tail:
+                handle_line(tail)
+
+            # Flush any pending buffered content after the stream ends. It was
+            # already run through the decoder and never closed, so it is emitted
+            # raw rather than parsed again
+            pending = "".join(pending_parts)
+            if pending and not pending.isspace() and not self._is_suppressed_text(pending):
+                emit(pending)
+            out.flush()
 
             # Wait for process completion
             process.wait()
 
-            # Do not emit token_count summary; fully suppressed per user feedback
-
             # Print stderr if there were errors
-            if process.stderr and process.returncode != 0:
-                stderr_output = process.stderr.read()
-                if stderr_output:
-                    print(stderr_output, file=sys.stderr)
+            if stderr_chunks and process.returncode != 0:
+                stderr_output = b"".join(stderr_chunks).decode("utf-8", errors="replace")
+                print(stderr_output, file=sys.stderr)
 
             return process.returncode
 
         except KeyboardInterrupt:
+            try:
+                out.flush()
+            except Exception:
+                pass
             print("\nInterrupted by user", file=sys.stderr)
             try:
                 process.terminate()
@@ -684,7 +867,7 @@ Environment Variables:
         # Build and execute command
         cmd = self.build_codex_command(args)
         self.verbose = args.verbose
-        return self.run_codex(cmd, verbose=args.verbose)
+        return self.run_codex(cmd, verbose=args.verbose, raw=args.raw)
 
 
 def main():
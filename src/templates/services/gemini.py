@@ -5,12 +5,40 @@ Headless wrapper around the Gemini CLI with JSON streaming and shorthand model s
 """
 
 import argparse
+import codecs
+import functools
 import json
 import os
+import re
+import selectors
+import shutil
 import subprocess
 import sys
-from datetime import datetime
-from typing import List, Optional, Tuple
+import time
+from typing import Iterable, List, Optional, Tuple, Union
+
+# Optional fast JSON parser for the common one-object-per-line case
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# json.dumps(obj, ensure_ascii=False) builds a new encoder per call; reuse one
+_json_dumps = json.JSONEncoder(ensure_ascii=False).encode
+
+
+# [epoch_second, formatted] for the most recent event header timestamp
+_TIMESTAMP_CACHE = [-1, ""]
+
+
+def _timestamp() -> str:
+    """Return local time as 'HH:MM:SS AM', formatted at most once per second."""
+    now = int(time.time())
+    if now != _TIMESTAMP_CACHE[0]:
+        _TIMESTAMP_CACHE[0] = now
+        _TIMESTAMP_CACHE[1] = time.strftime("%I:%M:%S %p", time.localtime(now))
+    return _TIMESTAMP_CACHE[1]
 
 
 class GeminiService:
@@ -30,6 +58,15 @@ class GeminiService:
         ":flash-3": "gemini-3.0-flash",
     }
 
+    # Control characters can appear raw inside streamed string values
+    _JSON_DECODER = json.JSONDecoder(strict=False)
+
+    # Characters that affect brace depth while an object spans several lines
+    _STRUCTURE_RE = re.compile(r'[{}"\\]')
+
+    # Payload fields that may carry event text when `content` is absent, in priority order
+    _CONTENT_FALLBACK_KEYS = ("response", "message", "output", "result", "text")
+
     def __init__(self):
         self.model_name = self.DEFAULT_MODEL
         self.output_format = self.DEFAULT_OUTPUT_FORMAT
@@ -47,18 +84,15 @@ class GeminiService:
             return self.MODEL_SHORTHANDS.get(model, model)
         return model
 
+    @staticmethod
+    @functools.lru_cache(maxsize=1)
+    def _gemini_path() -> Optional[str]:
+        """Resolve the gemini executable on PATH once per process."""
+        return shutil.which("gemini")
+
     def check_gemini_installed(self) -> bool:
         """Check if gemini CLI is installed and available."""
-        try:
-            result = subprocess.run(
-                ["which", "gemini"],
-                capture_output=True,
-                text=True,
-                check=False,
-            )
-            return result.returncode == 0
-        except Exception:
-            return False
+        return self._gemini_path() is not None
 
     def ensure_api_key_present(self) -> bool:
         """Validate that GEMINI_API_KEY is set for headless execution."""
@@ -149,10 +183,11 @@ Examples:
 
         return parser.parse_args()
 
-    def _first_nonempty_str(self, *values: Optional[str]) -> str:
-        """Return the first non-empty string from provided values."""
-        for val in values:
-            if isinstance(val, str) and val.strip() != "":
+    def _first_nonempty_str(self, source: dict, keys: Tuple[str, ...]) -> str:
+        """Return the first non-blank string among source[key] for keys, looked up lazily."""
+        for key in keys:
+            val = source.get(key)
+            if isinstance(val, str) and val and not val.isspace():
                 return val
         return ""
 
@@ -162,28 +197,23 @@ Examples:
             return ""
 
         content_val = payload.get("content")
+        # Streamed message deltas carry their text as a plain string
+        if isinstance(content_val, str):
+            return content_val
         if isinstance(content_val, list):
             parts: List[str] = []
             for entry in content_val:
                 if isinstance(entry, dict):
                     text_val = entry.get("text") or entry.get("response") or entry.get("output")
-                    if isinstance(text_val, str) and text_val.strip():
+                    if isinstance(text_val, str) and text_val and not text_val.isspace():
                         parts.append(text_val)
-                elif isinstance(entry, str) and entry.strip():
+                elif isinstance(entry, str) and entry and not entry.isspace():
                     parts.append(entry)
             if parts:
                 return "\n".join(parts)
-        elif isinstance(content_val, str):
-            return content_val
 
         # Fall back to common fields
-        return self._first_nonempty_str(
-            payload.get("response"),
-            payload.get("message"),
-            payload.get("output"),
-            payload.get("result") if isinstance(payload.get("result"), str) else "",
-            payload.get("text"),
-        )
+        return self._first_nonempty_str(payload, self._CONTENT_FALLBACK_KEYS)
 
     def _format_event_pretty(self, payload: dict) -> str:
         """
@@ -193,7 +223,7 @@ Examples:
         try:
             raw_type = payload.get("type") or payload.get("event") or "message"
             msg_type = str(raw_type).strip() or "message"
-            now = datetime.now().strftime("%I:%M:%S %p")
+            now = _timestamp()
 
             content = self._extract_content_text(payload)
             # If still empty, serialize result/output objects as JSON to keep content non-undefined
@@ -221,89 +251,96 @@ Examples:
                 tool_params = payload.get("parameters") or payload.get("tool_use") or payload.get("input")
                 if isinstance(tool_params, (dict, list)):
                     header["parameters"] = tool_params
-                    content = json.dumps(tool_params, ensure_ascii=False)
+                    content = _json_dumps(tool_params)
                 elif tool_params:
                     content = str(tool_params)
 
             if msg_type == "tool_result" and not content:
-                tool_output = self._first_nonempty_str(payload.get("output"), payload.get("result"))
+                tool_output = self._first_nonempty_str(payload, ("output", "result"))
                 if tool_output:
                     content = tool_output
 
             if msg_type == "init" and not content:
                 init_summary = {k: payload.get(k) for k in ["session_id", "model"] if payload.get(k)}
                 if init_summary:
-                    content = json.dumps(init_summary, ensure_ascii=False)
+                    content = _json_dumps(init_summary)
 
             if msg_type == "result" and not content:
                 if isinstance(payload.get("stats"), (dict, list)):
-                    content = json.dumps(payload.get("stats"), ensure_ascii=False)
+                    content = _json_dumps(payload.get("stats"))
 
             if content and "\n" in content:
-                return json.dumps(header, ensure_ascii=False) + "\ncontent:\n" + content
+                return _json_dumps(header) + "\ncontent:\n" + content
 
             if content != "":
                 header["content"] = content if content is not None else ""
 
-            return json.dumps(header, ensure_ascii=False)
+            return _json_dumps(header)
         except Exception:
-            return json.dumps(payload, ensure_ascii=False)
+            return _json_dumps(payload)
+
+    def _split_json_stream(self, text: str) -> Tuple[List[Union[dict, str]], str]:
+        """
+        Extract concatenated JSON objects from text with JSONDecoder.raw_decode.
+
+        Returns (items, remainder). Items are parsed dicts and any non-JSON text
+        between them, in stream order. The remainder is a trailing object that is
+        still incomplete and should be prepended to the next chunk.
+        """
+        items: List[Union[dict, str]] = []
+        idx = 0
+        while True:
+            start = text.find("{", idx)
+            noise = (text[idx:] if start < 0 else text[idx:start]).strip().strip("'\"")
+            if noise:
+                items.append(noise)
+            if start < 0:
+                return items, ""
+            try:
+                obj, idx = self._JSON_DECODER.raw_decode(text, start)
+            except json.JSONDecodeError as e:
+                # Running out of input (or inside an open string) means the
+                # object continues in a later chunk; anything else is malformed
+                if e.pos >= len(text.rstrip()) or e.msg.startswith("Unterminated string"):
+                    return items, text[start:]
+                # Resume at the next brace so a valid event following the
+                # malformed one on the same line is still parsed
+                idx = text.find("{", start + 1)
+                if idx < 0:
+                    idx = len(text)
+                items.append(text[start:idx].strip())
+                continue
+            items.append(obj)
 
-    def _split_json_stream(self, text: str) -> Tuple[List[str], str]:
+    def _scan_structure(
+        self, text: str, depth: int, in_str: bool, escaped: bool = False
+    ) -> Tuple[int, bool, bool]:
         """
-        Split a stream of concatenated JSON objects based on top-level brace balance.
-        Returns (complete_objects, remainder).
+        Advance JSON brace depth and string state over text.
+
+        Only quotes, braces and backslashes are visited, so the per-character
+        work happens in the regex engine. escaped carries a backslash that
+        ended the previous text inside a string. Returns the updated
+        (depth, in_str, escaped).
         """
-        objs: List[str] = []
-        buf: List[str] = []
-        depth = 0
-        in_str = False
-        esc = False
-        started = False
-
-        for ch in text:
+        skip = 0 if escaped else -1
+        for match in self._STRUCTURE_RE.finditer(text):
+            pos = match.start()
+            if pos == skip:
+                continue
+            ch = match.group()
             if in_str:
-                buf.append(ch)
-                if esc:
-                    esc = False
-                elif ch == "\\":
-                    esc = True
+                if ch == "\\":
+                    skip = pos + 1
                 elif ch == '"':
                     in_str = False
-                continue
-
-            if ch == '"':
+            elif ch == '"':
                 in_str = True
-                buf.append(ch)
-                continue
-
-            if ch == "{":
+            elif ch == "{":
                 depth += 1
-                started = True
-                buf.append(ch)
-                continue
-
-            if ch == "}":
+            elif ch == "}":
                 depth -= 1
-                buf.append(ch)
-                if started and depth == 0:
-                    candidate = "".join(buf).strip().strip("'\"")
-                    if candidate:
-                        objs.append(candidate)
-                    buf = []
-                    started = False
-                continue
-
-            if started:
-                buf.append(ch)
-            else:
-                # Treat delimiter separators (e.g., ASCII 0x7f) as whitespace
-                if ch == "\x7f":
-                    continue
-                buf.append(ch)
-
-        remainder = "".join(buf) if buf else ""
-        return objs, remainder
+        return depth, in_str, skip == len(text)
 
     def read_prompt_file(self, file_path: str) -> str:
         """Read prompt content from a file."""
@@ -319,7 +356,7 @@ Examples:
 
     def build_gemini_command(self, args: argparse.Namespace) -> List[str]:
         """Construct the Gemini CLI command for headless execution."""
-        cmd = ["gemini"]
+        cmd = [self._gemini_path() or "gemini"]
 
         if self.prompt:
             cmd.extend(["--prompt", self.prompt])
@@ -356,61 +393,142 @@ Examples:
             print("-" * 80, file=sys.stderr)
 
         try:
+            if self.output_format != "stream-json":
+                # text and json output carry no event stream to normalize, so
+                # gemini writes straight to our stdout with no parsing or copying
+                sys.stdout.flush()
+                process = subprocess.Popen(
+                    cmd,
+                    stderr=subprocess.PIPE,
+                    cwd=self.project_path,
+                    close_fds=False,
+                )
+                _, stderr_bytes = process.communicate()
+                if stderr_bytes and process.returncode != 0:
+                    print(stderr_bytes.decode("utf-8", errors="replace"), file=sys.stderr)
+                return process.returncode
+
             process = subprocess.Popen(
                 cmd,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
-                text=True,
-                bufsize=1,
-                universal_newlines=True,
+                bufsize=0,
                 cwd=self.project_path,
+                # Descriptors are non-inheritable by default (PEP 446), so skipping
+                # the close-all-fds pass in the child leaks nothing to gemini
+                close_fds=False,
             )
 
-            pending = ""
-
-            if process.stdout:
-                for raw_line in process.stdout:
-                    combined = (pending + raw_line).replace("\x7f", "\n")
-                    pending = ""
-
-                    if not combined.strip():
-                        continue
-
-                    parts, pending = self._split_json_stream(combined)
-
-                    if parts:
-                        for part in parts:
-                            try:
-                                parsed = json.loads(part)
-                                formatted = self._format_event_pretty(parsed)
-                                print(formatted, flush=True)
-                            except Exception:
-                                print(part, flush=True)
-                        continue
-
-                    # Fallback for non-JSON lines or partial content
-                    if pending:
-                        continue
-
-                    print(combined, end="" if combined.endswith("\n") else "\n", flush=True)
-
+            # Lines of a JSON object that is still open; joined and re-parsed
+            # only once a line that could close the object arrives
+            pending_parts: List[str] = []
+
+            # Events from one block read are collected here and written with a
+            # single write and flush, so a burst of events costs one syscall
+            out = sys.stdout
+            batch: List[str] = []
+
+            def emit_items(items: Iterable[Union[dict, str]]):
+                for item in items:
+                    if isinstance(item, dict):
+                        batch.append(self._format_event_pretty(item))
+                    else:
+                        batch.append(item)
+                    batch.append("\n")
+
+            def flush_batch():
+                if batch:
+                    out.write("".join(batch))
+                    batch.clear()
+                out.flush()
+
+            # (brace depth, inside-string flag, pending escape) of the pending
+            # object, advanced over each new line so buffered lines are never rescanned
+            pending_state = (0, False, False)
+
+            def handle_line(line: str):
+                nonlocal pending_state
+                if pending_parts:
+                    pending_parts.append(line)
+                    pending_state = self._scan_structure(line, *pending_state)
+                    if pending_state[0] > 0:
+                        return
+                    combined = "".join(pending_parts)
+                    pending_parts.clear()
+                else:
+                    # NDJSON fast path: a whole line holding exactly one object
+                    if ORJSON_AVAILABLE and line[:1] == "{":
+                        try:
+                            line_obj = orjson.loads(line)
+                        except orjson.JSONDecodeError:
+                            line_obj = None
+                        if isinstance(line_obj, dict):
+                            emit_items((line_obj,))
+                            return
+                    if line.isspace():
+                        return
+                    combined = line
+                items, remainder = self._split_json_stream(combined)
+                if remainder:
+                    pending_parts.append(remainder)
+                    pending_state = self._scan_structure(remainder, 0, False)
+                emit_items(items)
+
+            # Read both pipes in 64 KiB blocks; stderr is drained alongside stdout
+            # so a chatty stderr can never fill its pipe and stall gemini
+            stderr_chunks: List[bytes] = []
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+            partial = ""
+
+            with selectors.DefaultSelector() as sel:
+                sel.register(process.stdout, selectors.EVENT_READ, "stdout")
+                sel.register(process.stderr, selectors.EVENT_READ, "stderr")
+                while sel.get_map():
+                    for key, _ in sel.select():
+                        data = os.read(key.fd, 65536)
+                        if not data:
+                            sel.unregister(key.fileobj)
+                            continue
+                        if key.data == "stderr":
+                            stderr_chunks.append(data)
+                            continue
+
+                        # ASCII 0x7f is used as an event delimiter; treat it as a newline
+                        text = partial + decoder.decode(data).replace("\x7f", "\n")
+                        # Only hand over complete lines so plain-text output is
+                        # never split at a read boundary
+                        last_newline = text.rfind("\n")
+                        if last_newline < 0:
+                            partial = text
+                            continue
+                        partial = text[last_newline + 1:]
+                        for line in text[:last_newline].split("\n"):
+                            handle_line(line + "\n")
+                        flush_batch()
+
+            tail = partial + decoder.decode(b"", final=True).replace("\x7f", "\n")
+            if tail:
+                handle_line(tail)
+
+            # An object left open at EOF cannot be parsed; pass it through as-is
+            pending = "".join(pending_parts)
             if pending.strip():
-                try:
-                    parsed_tail = json.loads(pending)
-                    print(self._format_event_pretty(parsed_tail), flush=True)
-                except Exception:
-                    print(pending, flush=True)
+                batch.append(pending + "\n")
+            flush_batch()
 
             process.wait()
 
-            if process.stderr and process.returncode != 0:
-                stderr_output = process.stderr.read()
-                if stderr_output:
-                    print(stderr_output, file=sys.stderr)
+            if stderr_chunks and process.returncode != 0:
+                stderr_output = b"".join(stderr_chunks).decode("utf-8", errors="replace")
+                print(stderr_output, file=sys.stderr)
 
             return process.returncode
 
         except KeyboardInterrupt:
+            try:
+                sys.stdout.flush()
+            except Exception:
+                pass
             print("\nInterrupted by user", file=sys.stderr)
             try:
                 process.terminate()
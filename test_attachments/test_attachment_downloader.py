@@ -12,9 +12,7 @@ These tests verify:
 """
 
 import json
-import os
 import pytest
-import tempfile
 from pathlib import Path
 from unittest.mock import Mock, patch, MagicMock
 
@@ -30,67 +28,73 @@ except ImportError:
 
 from attachment_downloader import (
     AttachmentDownloader,
+    _concurrency_from_env,
     format_attachments_section,
     is_attachments_enabled,
     create_downloader
 )
 
 
+@pytest.fixture(scope="module")
+def readonly_downloader(tmp_path_factory):
+    """Shared downloader for tests that never touch the filesystem."""
+    return AttachmentDownloader(base_dir=str(tmp_path_factory.mktemp("readonly")))
+
+
 class TestAttachmentDownloader:
     """Tests for AttachmentDownloader class."""
 
     @pytest.fixture
-    def temp_dir(self):
-        """Create a temporary directory for tests."""
-        with tempfile.TemporaryDirectory() as tmpdir:
-            yield tmpdir
+    def temp_dir(self, tmp_path):
+        """Temporary directory for tests, managed by pytest."""
+        return tmp_path
 
     @pytest.fixture
     def downloader(self, temp_dir):
         """Create a downloader instance with temp directory."""
-        return AttachmentDownloader(base_dir=temp_dir)
+        return AttachmentDownloader(base_dir=str(temp_dir))
 
     # =========================================================================
     # Filename Generation Tests
     # =========================================================================
 
-    def test_generate_safe_filename_basic(self, downloader):
+    def test_generate_safe_filename_basic(self, readonly_downloader):
         """Test basic filename generation."""
-        result = downloader._generate_safe_filename("report.pdf", "1234567890")
+        result = readonly_downloader._generate_safe_filename("report.pdf", "1234567890")
         assert result == "1234567890_report.pdf"
 
-    def test_generate_safe_filename_with_spaces(self, downloader):
+    def test_generate_safe_filename_with_spaces(self, readonly_downloader):
         """Test filename with spaces is sanitized."""
-        result = downloader._generate_safe_filename("Q4 Report Final.pdf", "123")
+        result = readonly_downloader._generate_safe_filename("Q4 Report Final.pdf", "123")
         assert result == "123_Q4_Report_Final.pdf"
 
-    def test_generate_safe_filename_with_special_chars(self, downloader):
+    def test_generate_safe_filename_with_special_chars(self, readonly_downloader):
         """Test filename with special characters is sanitized."""
-        result = downloader._generate_safe_filename("report (1) [final].pdf", "ts")
+        result = readonly_downloader._generate_safe_filename("report (1) [final].pdf", "ts")
         # Trailing underscore is stripped after sanitization
         assert result == "ts_report_1_final.pdf"
 
-    def test_generate_safe_filename_truncation(self, downloader):
+    def test_generate_safe_filename_truncation(self, readonly_downloader):
         """Test long filenames are truncated."""
         long_name = "a" * 150 + ".pdf"
-        result = downloader._generate_safe_filename(long_name, "123")
+        result = readonly_downloader._generate_safe_filename(long_name, "123")
         # prefix (3) + underscore (1) + max stem (100) + extension (4) = 108
         assert len(result) <= 115
 
-    def test_generate_safe_filename_empty_stem(self, downloader):
+    def test_generate_safe_filename_empty_stem(self, readonly_downloader):
         """Test filename with only special characters."""
-        result = downloader._generate_safe_filename("....pdf", "123")
+        result = readonly_downloader._generate_safe_filename("....pdf", "123")
         # The filename "....pdf" has stem "..." which becomes "..." after sanitization
         assert result == "123_....pdf"
 
-    def test_generate_safe_filename_preserves_extension(self, downloader):
+    def test_generate_safe_filename_preserves_extension(self, readonly_downloader):
         """Test that file extension is preserved and lowercased."""
-        result = downloader._generate_safe_filename("Report.PDF", "ts")
+        result = readonly_downloader._generate_safe_filename("Report.PDF", "ts")
         assert result.endswith(".pdf")
 
-    def test_generate_safe_filename_unicode(self, downloader):
+    def test_generate_safe_filename_unicode(self, readonly_downloader):
         """Test filename with unicode characters."""
-        result = downloader._generate_safe_filename("报告.pdf", "123")
+        result = readonly_downloader._generate_safe_filename("报告.pdf", "123")
         # Unicode should be replaced with underscores
         assert result.startswith("123_")
         assert result.endswith(".pdf")
@@ -101,57 +105,60 @@ class TestAttachmentDownloader:
 
     def test_handle_collision_no_existing(self, downloader, temp_dir):
         """Test path returned as-is when no collision."""
-        target = Path(temp_dir) / "test.txt"
+        target = temp_dir / "test.txt"
         result = downloader._handle_collision(target)
         assert result == target
 
     def test_handle_collision_single(self, downloader, temp_dir):
         """Test counter appended when file exists."""
-        target = Path(temp_dir) / "test.txt"
+        target = temp_dir / "test.txt"
         target.touch()
 
         result = downloader._handle_collision(target)
-        assert result == Path(temp_dir) / "test_1.txt"
+        assert result == temp_dir / "test_1.txt"
 
     def test_handle_collision_multiple(self, downloader, temp_dir):
         """Test multiple collisions handled correctly."""
-        target = Path(temp_dir) / "test.txt"
+        target = temp_dir / "test.txt"
         target.touch()
-        (Path(temp_dir) / "test_1.txt").touch()
-        (Path(temp_dir) / "test_2.txt").touch()
+        (temp_dir / "test_1.txt").touch()
+        (temp_dir / "test_2.txt").touch()
 
         result = downloader._handle_collision(target)
-        assert result == Path(temp_dir) / "test_3.txt"
+        assert result == temp_dir / "test_3.txt"
 
     # =========================================================================
     # Domain Validation Tests
     # =========================================================================
 
-    def test_is_allowed_domain_slack_files(self, downloader):
+    def test_is_allowed_domain_slack_files(self, readonly_downloader):
         """Test Slack file domains are allowed."""
-        assert downloader._is_allowed_domain("https://files.slack.com/files-pri/T123/F456/image.png")
-        assert downloader._is_allowed_domain("https://files.slack.com/files/T123/F456")
+        assert readonly_downloader._is_allowed_domain("https://files.slack.com/files-pri/T123/F456/image.png")
+        assert readonly_downloader._is_allowed_domain("https://files.slack.com/files/T123/F456")
 
-    def test_is_allowed_domain_github(self, downloader):
+    def test_is_allowed_domain_github(self, readonly_downloader):
         """Test GitHub domains are allowed."""
-        assert downloader._is_allowed_domain("https://github.com/user/repo/assets/123")
-        assert downloader._is_allowed_domain("https://user-images.githubusercontent.com/123/abc.png")
-        assert downloader._is_allowed_domain("https://private-user-images.githubusercontent.com/123/abc.png")
+        assert readonly_downloader._is_allowed_domain("https://github.com/user/repo/assets/123")
+        assert readonly_downloader._is_allowed_domain("https://user-images.githubusercontent.com/123/abc.png")
+        assert readonly_downloader._is_allowed_domain("https://private-user-images.githubusercontent.com/123/abc.png")
 
-    def test_is_allowed_domain_invalid(self, downloader):
+    def test_is_allowed_domain_invalid(self, readonly_downloader):
         """Test non-allowed domains are rejected."""
-        assert not downloader._is_allowed_domain("https://malicious.com/file.exe")
-        assert not downloader._is_allowed_domain("https://example.com/test.pdf")
-        assert not downloader._is_allowed_domain("https://dropbox.com/file.zip")
-
-    def test_is_allowed_domain_subdomain(self, downloader):
+        assert not readonly_downloader._is_allowed_domain("https://malicious.com/file.exe")
+        assert not readonly_downloader._is_allowed_domain("https://example.com/test.pdf")
+        assert not readonly_downloader._is_allowed_domain("https://dropbox.com/file.zip")
+        # Allowed names embedded in a lookalike host must not match
+        assert not readonly_downloader._is_allowed_domain("https://github.com.evil.com/file.zip")
+        assert not readonly_downloader._is_allowed_domain("https://notgithub.com/file.zip")
+
+    def test_is_allowed_domain_subdomain(self, readonly_downloader):
         """Test subdomains of allowed domains work."""
-        assert downloader._is_allowed_domain("https://api.github.com/download")
+        assert readonly_downloader._is_allowed_domain("https://api.github.com/download")
 
-    def test_is_allowed_domain_malformed_url(self, downloader):
+    def test_is_allowed_domain_malformed_url(self, readonly_downloader):
         """Test malformed URLs are rejected."""
-        assert not downloader._is_allowed_domain("")
-        assert not downloader._is_allowed_domain("not-a-url")
+        assert not readonly_downloader._is_allowed_domain("")
+        assert not readonly_downloader._is_allowed_domain("not-a-url")
 
     # =========================================================================
     # File Type Filtering Tests
@@ -161,7 +168,7 @@ class TestAttachmentDownloader:
         """Test .exe files are blocked."""
         path, error = downloader.download_file(
             url="https://github.com/user/repo/releases/app.exe",
-            target_dir=Path(temp_dir),
+            target_dir=temp_dir,
             filename_prefix="123",
             original_filename="malware.exe"
         )
@@ -172,7 +179,7 @@ class TestAttachmentDownloader:
         """Test .dmg files are blocked."""
         path, error = downloader.download_file(
             url="https://github.com/user/repo/releases/app.dmg",
-            target_dir=Path(temp_dir),
+            target_dir=temp_dir,
             filename_prefix="123",
             original_filename="installer.dmg"
         )
@@ -183,7 +190,7 @@ class TestAttachmentDownloader:
         """Test blocked domains are rejected."""
         path, error = downloader.download_file(
             url="https://evil.com/malware.pdf",
-            target_dir=Path(temp_dir),
+            target_dir=temp_dir,
             filename_prefix="123",
             original_filename="document.pdf"
         )
@@ -209,7 +216,7 @@ class TestAttachmentDownloader:
             headers={'content-length': str(len(content))}
         )
 
-        target_dir = Path(temp_dir) / "downloads"
+        target_dir = temp_dir / "downloads"
         path, error = downloader.download_file(
             url=url,
             target_dir=target_dir,
@@ -249,7 +256,7 @@ class TestAttachmentDownloader:
             headers={'content-length': str(100 * 1024 * 1024)}  # 100MB
         )
 
-        target_dir = Path(temp_dir) / "downloads"
+        target_dir = temp_dir / "downloads"
         path, error = downloader.download_file(
             url=url,
             target_dir=target_dir,
@@ -272,7 +279,7 @@ class TestAttachmentDownloader:
             status=404
         )
 
-        target_dir = Path(temp_dir) / "downloads"
+        target_dir = temp_dir / "downloads"
         path, error = downloader.download_file(
             url=url,
             target_dir=target_dir,
@@ -283,13 +290,72 @@ class TestAttachmentDownloader:
         assert path is None
         assert "HTTP error" in error or "404" in error
 
+    @pytest.mark.skipif(not RESPONSES_AVAILABLE, reason="responses library not available")
+    @responses.activate
+    def test_download_many_keeps_order_and_unique_paths(self, downloader, temp_dir):
+        """Test concurrent downloads of the same name get distinct paths, in input order."""
+        target_dir = temp_dir / "downloads"
+        downloads = []
+        for i in range(4):
+            url = f"https://files.slack.com/files-pri/T123/F{i}/notes.txt"
+            responses.add(responses.GET, url, body=f"body {i}".encode(), status=200)
+            downloads.append({
+                'url': url,
+                'target_dir': target_dir,
+                'filename_prefix': "123",
+                'original_filename': "notes.txt",
+            })
+        downloads.append({
+            'url': "https://evil.com/notes.txt",
+            'target_dir': target_dir,
+            'filename_prefix': "123",
+            'original_filename': "notes.txt",
+        })
+
+        results = downloader.download_many(downloads, max_workers=4)
+
+        assert len(results) == 5
+        paths = [path for path, error in results[:4]]
+        assert all(error is None for _, error in results[:4])
+        assert len(set(paths)) == 4
+        for i, path in enumerate(paths):
+            assert Path(path).read_bytes() == f"body {i}".encode()
+        assert results[4][0] is None
+        assert "Domain not allowed" in results[4][1]
+
+    @pytest.mark.skipif(not RESPONSES_AVAILABLE, reason="responses library not available")
+    @responses.activate
+    def test_download_file_revalidates_with_etag(self, downloader, temp_dir):
+        """Test on_etag reports the validator and a cached download is reused on 304."""
+        url = "https://github.com/user-attachments/assets/abc/shot.png"
+        responses.add(responses.GET, url, body=b"png bytes", status=200, headers={'ETag': '"v1"'})
+        responses.add(
+            responses.GET,
+            url,
+            status=304,
+            match=[responses.matchers.header_matcher({'If-None-Match': '"v1"'})]
+        )
+
+        target_dir = temp_dir / "downloads"
+        kwargs = dict(url=url, target_dir=target_dir, filename_prefix="issue_1", original_filename="shot.png")
+        seen = []
+        first_path, first_error = downloader.download_file(
+            **kwargs, on_etag=lambda etag, path: seen.append((etag, path))
+        )
+        second_path, second_error = downloader.download_file(**kwargs, cached=('"v1"', first_path))
+
+        assert first_error is None and second_error is None
+        assert seen == [('"v1"', first_path)]
+        assert second_path == first_path
+        assert sorted(p.name for p in target_dir.iterdir()) == ["issue_1_shot.png", "issue_1_shot.png.meta.json"]
+
     # =========================================================================
     # Metadata Tests
     # =========================================================================
 
     def test_write_metadata(self, downloader, temp_dir):
         """Test metadata file is created correctly."""
-        test_file = Path(temp_dir) / "test.txt"
+        test_file = temp_dir / "test.txt"
         test_file.write_text("test")
 
         metadata = {
@@ -315,10 +381,10 @@ class TestAttachmentDownloader:
 
     def test_ensure_directories(self, temp_dir):
         """Test directory structure is created."""
-        downloader = AttachmentDownloader(base_dir=temp_dir)
+        downloader = AttachmentDownloader(base_dir=str(temp_dir))
 
-        assert (Path(temp_dir) / 'slack').exists()
-        assert (Path(temp_dir) / 'github').exists()
+        assert (temp_dir / 'slack').exists()
+        assert (temp_dir / 'github').exists()
 
 
 class TestFormatAttachmentsSection:
@@ -352,29 +418,26 @@ class TestFormatAttachmentsSection:
 class TestIsAttachmentsEnabled:
     """Tests for is_attachments_enabled function."""
 
-    def test_default_enabled(self):
+    def test_default_enabled(self, monkeypatch):
         """Test attachments are enabled by default."""
         # Clear any existing env var
-        os.environ.pop('JUNO_DOWNLOAD_ATTACHMENTS', None)
+        monkeypatch.delenv('JUNO_DOWNLOAD_ATTACHMENTS', raising=False)
         assert is_attachments_enabled() is True
 
-    def test_explicitly_enabled(self):
+    def test_explicitly_enabled(self, monkeypatch):
         """Test explicit enable values."""
         for value in ['true', 'True', 'TRUE', '1', 'yes', 'YES']:
-            os.environ['JUNO_DOWNLOAD_ATTACHMENTS'] = value
+            monkeypatch.setenv('JUNO_DOWNLOAD_ATTACHMENTS', value)
             assert is_attachments_enabled() is True
-        os.environ.pop('JUNO_DOWNLOAD_ATTACHMENTS', None)
 
-    def test_disabled(self):
+    def test_disabled(self, monkeypatch):
         """Test disable values."""
-        os.environ['JUNO_DOWNLOAD_ATTACHMENTS'] = 'false'
+        monkeypatch.setenv('JUNO_DOWNLOAD_ATTACHMENTS', 'false')
         assert is_attachments_enabled() is False
 
-        os.environ['JUNO_DOWNLOAD_ATTACHMENTS'] = '0'
+        monkeypatch.setenv('JUNO_DOWNLOAD_ATTACHMENTS', '0')
         assert is_attachments_enabled() is False
 
-        os.environ.pop('JUNO_DOWNLOAD_ATTACHMENTS', None)
-
 
 class TestCreateDownloader:
     """Tests for create_downloader factory function."""
@@ -389,31 +452,23 @@ class TestCreateDownloader:
 class TestEnvironmentConfiguration:
     """Tests for environment variable configuration."""
 
-    @pytest.fixture(autouse=True)
-    def cleanup_env(self):
-        """Clean up environment variables after each test."""
-        yield
-        for var in ['JUNO_MAX_ATTACHMENT_SIZE', 'JUNO_ALLOWED_FILE_TYPES',
-                    'JUNO_SKIP_FILE_TYPES', 'JUNO_ALLOWED_DOMAINS']:
-            os.environ.pop(var, None)
-
-    def test_max_size_from_env(self, tmp_path):
+    def test_max_size_from_env(self, tmp_path, monkeypatch):
         """Test max size configuration from environment."""
-        os.environ['JUNO_MAX_ATTACHMENT_SIZE'] = '1048576'  # 1MB
+        monkeypatch.setenv('JUNO_MAX_ATTACHMENT_SIZE', '1048576')  # 1MB
         downloader = AttachmentDownloader(base_dir=str(tmp_path))
         assert downloader.max_size == 1048576
 
-    def test_allowed_domains_from_env(self, tmp_path):
+    def test_allowed_domains_from_env(self, tmp_path, monkeypatch):
         """Test additional domains from environment."""
-        os.environ['JUNO_ALLOWED_DOMAINS'] = 'my-cdn.example.com,storage.company.io'
+        monkeypatch.setenv('JUNO_ALLOWED_DOMAINS', 'my-cdn.example.com,storage.company.io')
         downloader = AttachmentDownloader(base_dir=str(tmp_path))
 
         assert downloader._is_allowed_domain('https://my-cdn.example.com/file.pdf')
         assert downloader._is_allowed_domain('https://storage.company.io/doc.txt')
 
-    def test_allowed_file_types_from_env(self, tmp_path):
+    def test_allowed_file_types_from_env(self, tmp_path, monkeypatch):
         """Test file type filtering from environment."""
-        os.environ['JUNO_ALLOWED_FILE_TYPES'] = 'pdf,png'
+        monkeypatch.setenv('JUNO_ALLOWED_FILE_TYPES', 'pdf,png')
         downloader = AttachmentDownloader(base_dir=str(tmp_path))
 
         # Only pdf and png should be allowed
@@ -421,9 +476,9 @@ class TestEnvironmentConfiguration:
         assert '.png' in downloader._allowed_types
         assert '.jpg' not in downloader._allowed_types
 
-    def test_skip_file_types_from_env(self, tmp_path):
+    def test_skip_file_types_from_env(self, tmp_path, monkeypatch):
         """Test skip types from environment."""
-        os.environ['JUNO_SKIP_FILE_TYPES'] = 'zip,tar,gz'
+        monkeypatch.setenv('JUNO_SKIP_FILE_TYPES', 'zip,tar,gz')
         downloader = AttachmentDownloader(base_dir=str(tmp_path))
 
         # These extensions should be in skip list
@@ -431,6 +486,32 @@ class TestEnvironmentConfiguration:
         assert '.tar' in downloader._skip_types
         assert '.gz' in downloader._skip_types
 
+    @pytest.mark.parametrize("value, expected", [
+        ('', AttachmentDownloader.DEFAULT_CONCURRENCY),
+        ('3', 3),
+        ('0', 1),
+        ('-2', 1),
+        ('many', AttachmentDownloader.DEFAULT_CONCURRENCY),
+    ])
+    def test_concurrency_from_env(self, monkeypatch, value, expected):
+        """Test invalid or non-positive concurrency values fall back or clamp."""
+        monkeypatch.setenv('JUNO_ATTACHMENT_CONCURRENCY', value)
+        assert _concurrency_from_env(AttachmentDownloader.DEFAULT_CONCURRENCY) == expected
+
+    def test_download_many_tolerates_invalid_concurrency(self, tmp_path, monkeypatch):
+        """Test download_many still runs when the concurrency setting is not an integer."""
+        monkeypatch.setenv('JUNO_ATTACHMENT_CONCURRENCY', 'many')
+        downloader = AttachmentDownloader(base_dir=str(tmp_path))
+        downloads = [
+            {'url': f"https://evil.com/{i}.txt", 'target_dir': tmp_path,
+             'filename_prefix': "1", 'original_filename': f"{i}.txt"}
+            for i in range(3)
+        ]
+
+        results = downloader.download_many(downloads)
+
+        assert [error for _, error in results] == ["Domain not allowed: evil.com"] * 3
+
 
 if __name__ == '__main__':
     pytest.main([__file__, '-v'])
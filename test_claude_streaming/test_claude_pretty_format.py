@@ -0,0 +1,158 @@
+import io
+import json
+import os
+import subprocess
+import sys
+from contextlib import redirect_stdout
+
+import pytest
+
+
+def _load_claude_service():
+    here = os.path.dirname(__file__)
+    services_dir = os.path.abspath(os.path.join(here, "..", "src", "templates", "services"))
+    if services_dir not in sys.path:
+        sys.path.insert(0, services_dir)
+    from claude import ClaudeService  # type: ignore
+    return ClaudeService()
+
+
+@pytest.fixture
+def svc(monkeypatch):
+    monkeypatch.delenv("CLAUDE_USER_MESSAGE_PRETTY_TRUNCATE", raising=False)
+    service = _load_claude_service()
+    monkeypatch.setattr(sys.modules[type(service).__module__], "_timestamp", lambda: "12:00:00 PM")
+    return service
+
+
+def _pretty(svc, event: dict):
+    """Format one event, joining multi-line tuple output the way run_claude writes it."""
+    formatted = svc.pretty_format_json(json.dumps(event))
+    if isinstance(formatted, tuple):
+        assert len(formatted) == 3
+        return "".join(formatted)
+    return formatted
+
+
+def test_assistant_tool_use_with_multiline_prompt_renders_prompt_block(svc):
+    event = {
+        "type": "assistant",
+        "message": {"content": [{
+            "type": "tool_use",
+            "name": "Task",
+            "input": {"description": "Explore", "prompt": "Step one\nStep two"},
+        }]},
+    }
+
+    header, _, body = _pretty(svc, event).partition("\nprompt:\n")
+
+    assert json.loads(header) == {
+        "type": "assistant",
+        "datetime": "12:00:00 PM",
+        "counter": "#1",
+        "tool_use": {"name": "Task", "input": {"description": "Explore"}},
+    }
+    assert body == "Step one\nStep two"
+
+
+def test_assistant_multiline_text_renders_content_block(svc):
+    event = {"type": "assistant", "message": {"content": [{"type": "text", "text": "Line 1\nLine 2"}]}}
+
+    assert _pretty(svc, event) == (
+        '{"type": "assistant", "datetime": "12:00:00 PM", "counter": "#1"}'
+        "\ncontent:\nLine 1\nLine 2"
+    )
+
+
+def test_user_message_is_truncated_to_configured_lines(svc):
+    svc.user_message_truncate = 2
+    event = {"type": "user", "message": {"content": [{"type": "text", "text": "a\nb\nc\nd"}]}}
+
+    assert _pretty(svc, event) == (
+        '{"type": "user", "datetime": "12:00:00 PM", "counter": "#1"}'
+        "\ncontent:\na\nb\n[Truncated...]"
+    )
+
+
+def test_progress_events(svc):
+    multiline = {
+        "type": "progress",
+        "data": {"type": "bash_progress", "output": "out 1\nout 2", "elapsedTimeSeconds": 3, "totalLines": 2},
+    }
+    single = {"type": "progress", "data": {"type": "bash_progress", "output": "done"}}
+    hook = {"type": "progress", "data": {"type": "hook_progress"}}
+
+    header, _, body = _pretty(svc, multiline).partition("\n[Progress] output:\n")
+    assert json.loads(header) == {
+        "type": "progress",
+        "progress_type": "bash_progress",
+        "datetime": "12:00:00 PM",
+        "counter": "#1",
+        "elapsed": "3s",
+        "lines": 2,
+    }
+    assert body == "out 1\nout 2"
+
+    tagged = _pretty(svc, single)
+    assert tagged.startswith("[Progress] ")
+    assert json.loads(tagged[len("[Progress] "):])["output"] == "done"
+
+    assert svc.pretty_format_json(json.dumps(hook)) is None
+
+
+def test_result_with_multiline_text_renders_result_block(svc):
+    event = {"type": "result", "subtype": "success", "result": "Done\nAll good"}
+
+    header, _, body = _pretty(svc, event).partition("\nresult:\n")
+
+    assert json.loads(header) == {
+        "datetime": "12:00:00 PM",
+        "counter": "#1",
+        "type": "result",
+        "subtype": "success",
+    }
+    assert body == "Done\nAll good"
+
+
+def test_unknown_and_non_string_types_use_the_generic_formatter(svc):
+    assert json.loads(_pretty(svc, {"type": "system", "subtype": "init"})) == {
+        "datetime": "12:00:00 PM", "counter": "#1", "type": "system", "subtype": "init",
+    }
+    assert json.loads(_pretty(svc, {"type": ["user"], "x": 1})) == {
+        "datetime": "12:00:00 PM", "counter": "#2", "type": ["user"], "x": 1,
+    }
+    assert svc.pretty_format_json("not json") == "not json"
+
+
+class _FakeClaudeProcess:
+    """Popen stand-in for text-mode, line-iterated claude output."""
+
+    def __init__(self, stdout_text: str):
+        self.stdout = io.StringIO(stdout_text)
+        self.stderr = io.StringIO("")
+        self.returncode = None
+
+    def wait(self):
+        self.returncode = 0
+        return 0
+
+
+def test_run_claude_writes_multiline_events_in_parts(svc, monkeypatch, tmp_path):
+    svc.project_path = str(tmp_path)
+    events = [
+        {"type": "assistant", "message": {"content": [{"type": "text", "text": "Hello\nWorld"}]}},
+        {"type": "result", "result": "ok"},
+    ]
+    stdout_text = "".join(json.dumps(e) + "\n" for e in events)
+    monkeypatch.setattr(subprocess, "Popen", lambda cmd, **kwargs: _FakeClaudeProcess(stdout_text))
+
+    buf = io.StringIO()
+    with redirect_stdout(buf):
+        code = svc.run_claude(["claude"], verbose=False)
+
+    assert code == 0
+    assert buf.getvalue() == (
+        '{"type": "assistant", "datetime": "12:00:00 PM", "counter": "#1"}\ncontent:\nHello\nWorld\n'
+        '{"datetime": "12:00:00 PM", "counter": "#2", "type": "result", "result": "ok"}\n'
+    )
+    assert svc.last_result_event == {"type": "result", "result": "ok"}
@@ -5,6 +5,8 @@ import json
 import subprocess
 from contextlib import redirect_stdout
 
+import pytest
+
 
 def _build_ndjson_stream():
     events = [
@@ -15,10 +17,8 @@ def _build_ndjson_stream():
         {"msg": {"type": "agent_reasoning", "text": "Think\nMore"}},
         {"msg": {"type": "exec_command_end", "formatted_output": "Done\nOK"}},
     ]
-    # printf-escaped single-line strings
     lines = [json.dumps(e) for e in events]
-    # Join with literal \n for printf
-    return "\\n".join(lines) + "\\n"
+    return "\n".join(lines) + "\n"
 
 
 def _build_item_schema_stream():
@@ -51,7 +51,7 @@ def _build_item_schema_stream():
         },
     ]
     lines = [json.dumps(e) for e in events]
-    return "\\n".join(lines) + "\\n"
+    return "\n".join(lines) + "\n"
 
 
 def _build_pretty_item_schema_stream():
@@ -114,7 +114,7 @@ def _build_nested_item_schema_stream():
             },
         },
     ]
-    return "\\n".join(json.dumps(e) for e in events) + "\\n"
+    return "\n".join(json.dumps(e) for e in events) + "\n"
 
 
 def _build_agent_message_text_stream():
@@ -128,7 +128,7 @@ def _build_agent_message_text_stream():
             },
         },
     ]
-    return "\\n".join(json.dumps(e) for e in events) + "\\n"
+    return "\n".join(json.dumps(e) for e in events) + "\n"
 
 
 def _build_item_schema_stream_without_ids():
@@ -149,7 +149,7 @@ def _build_item_schema_stream_without_ids():
         },
     ]
     lines = [json.dumps(e) for e in events]
-    return "\\n".join(lines) + "\\n"
+    return "\n".join(lines) + "\n"
 
 
 def _load_codex_service():
@@ -164,21 +164,51 @@ def _load_codex_service():
     return CodexService()
 
 
-def test_codex_stream_filters_suppressed_types():
-    svc = _load_codex_service()
+class _FakeCodexProcess:
+    """Popen stand-in that replays canned stdout through a real pipe."""
 
-    ndjson = _build_ndjson_stream()
-    cmd = [
-        "bash",
-        "-lc",
-        f"printf '%s' '{ndjson}'",
-    ]
+    def __init__(self, stdout_bytes: bytes):
+        # run_codex selects on the pipes' file descriptors, so BytesIO won't do
+        self.stdout = self._pipe_with(stdout_bytes)
+        self.stderr = self._pipe_with(b"")
+        self.returncode = None
+
+    @staticmethod
+    def _pipe_with(data: bytes):
+        read_fd, write_fd = os.pipe()
+        with os.fdopen(write_fd, "wb") as writer:
+            writer.write(data)
+        return os.fdopen(read_fd, "rb", buffering=0)
+
+    def wait(self):
+        self.stdout.close()
+        self.stderr.close()
+        self.returncode = 0
+        return 0
+
+    def terminate(self):
+        pass
+
+
+@pytest.fixture
+def run_codex_stream(monkeypatch):
+    """Return a runner that feeds canned codex output to svc.run_codex in-process."""
+
+    def run(svc, stream: str):
+        stdout_bytes = stream.encode("utf-8")
+        monkeypatch.setattr(subprocess, "Popen", lambda cmd, **kwargs: _FakeCodexProcess(stdout_bytes))
+        buf = io.StringIO()
+        with redirect_stdout(buf):
+            code = svc.run_codex(["codex"], verbose=False)
+        return code, buf.getvalue()
+
+    return run
 
-    buf = io.StringIO()
-    with redirect_stdout(buf):
-        code = svc.run_codex(cmd, verbose=False)
 
-    out = buf.getvalue()
+def test_codex_stream_filters_suppressed_types(run_codex_stream):
+    svc = _load_codex_service()
+
+    code, out = run_codex_stream(svc, _build_ndjson_stream())
 
     # Should succeed
     assert code == 0
@@ -194,21 +224,10 @@ def test_codex_stream_filters_suppressed_types():
     assert '"type": "exec_command_end"' in out and 'formatted_output:\nDone\nOK' in out
 
 
-def test_codex_stream_handles_item_schema():
+def test_codex_stream_handles_item_schema(run_codex_stream):
     svc = _load_codex_service()
 
-    ndjson = _build_item_schema_stream()
-    cmd = [
-        "bash",
-        "-lc",
-        f"printf '%s' '{ndjson}'",
-    ]
-
-    buf = io.StringIO()
-    with redirect_stdout(buf):
-        code = svc.run_codex(cmd, verbose=False)
-
-    out = buf.getvalue()
+    code, out = run_codex_stream(svc, _build_item_schema_stream())
 
     assert code == 0
 
@@ -227,22 +246,10 @@ def test_codex_stream_handles_item_schema():
     assert "kanban.sh help" in out
 
 
-def test_codex_stream_handles_pretty_multiline_item_schema():
+def test_codex_stream_handles_pretty_multiline_item_schema(run_codex_stream):
     svc = _load_codex_service()
 
-    pretty_stream = _build_pretty_item_schema_stream()
-    stream_literal = repr(pretty_stream)
-    cmd = [
-        "python",
-        "-c",
-        f"print({stream_literal}, end='')",
-    ]
-
-    buf = io.StringIO()
-    with redirect_stdout(buf):
-        code = svc.run_codex(cmd, verbose=False)
-
-    out = buf.getvalue()
+    code, out = run_codex_stream(svc, _build_pretty_item_schema_stream())
 
     assert code == 0
 
@@ -257,21 +264,10 @@ def test_codex_stream_handles_pretty_multiline_item_schema():
     assert '\n  "aggregated_output":' not in out
 
 
-def test_codex_stream_handles_nested_item_fields_and_message_content():
+def test_codex_stream_handles_nested_item_fields_and_message_content(run_codex_stream):
     svc = _load_codex_service()
 
-    ndjson = _build_nested_item_schema_stream()
-    cmd = [
-        "bash",
-        "-lc",
-        f"printf '%s' '{ndjson}'",
-    ]
-
-    buf = io.StringIO()
-    with redirect_stdout(buf):
-        code = svc.run_codex(cmd, verbose=False)
-
-    out = buf.getvalue()
+    code, out = run_codex_stream(svc, _build_nested_item_schema_stream())
 
     assert code == 0
 
@@ -289,21 +285,10 @@ def test_codex_stream_handles_nested_item_fields_and_message_content():
     assert '"id": "item_message"' in out
 
 
-def test_codex_agent_message_text_field_renders_message():
+def test_codex_agent_message_text_field_renders_message(run_codex_stream):
     svc = _load_codex_service()
 
-    ndjson = _build_agent_message_text_stream()
-    cmd = [
-        "bash",
-        "-lc",
-        f"printf '%s' '{ndjson}'",
-    ]
-
-    buf = io.StringIO()
-    with redirect_stdout(buf):
-        code = svc.run_codex(cmd, verbose=False)
-
-    out = buf.getvalue()
+    code, out = run_codex_stream(svc, _build_agent_message_text_stream())
 
     assert code == 0
     assert '"type": "item.completed"' in out
@@ -312,24 +297,190 @@ def test_codex_agent_message_text_field_renders_message():
     assert '"id": "item_agent_text"' in out
 
 
-def test_codex_stream_synthesizes_missing_item_ids():
+def test_codex_stream_synthesizes_missing_item_ids(run_codex_stream):
     svc = _load_codex_service()
 
-    ndjson = _build_item_schema_stream_without_ids()
-    cmd = [
-        "bash",
-        "-lc",
-        f"printf '%s' '{ndjson}'",
-    ]
-
-    buf = io.StringIO()
-    with redirect_stdout(buf):
-        code = svc.run_codex(cmd, verbose=False)
-
-    out = buf.getvalue()
+    code, out = run_codex_stream(svc, _build_item_schema_stream_without_ids())
 
     assert code == 0
     # Synthesized ids should appear and increment
     assert '"id": "item_0"' in out
     assert '"id": "item_1"' in out
     assert out.index("item_0") < out.index("item_1")
+
+
+def test_codex_stream_parses_multiline_object_once_it_closes(run_codex_stream, monkeypatch):
+    svc = _load_codex_service()
+    event = {
+        "type": "item.completed",
+        "item": {
+            "id": "item_braces",
+            "type": "command_execution",
+            "result": {"aggregated_output": "a } b\n{ c", "exit_code": 0},
+        },
+    }
+    stream = json.dumps(event, indent=2) + "\n"
+
+    split_calls = []
+    original_split = type(svc)._split_json_stream
+
+    def counting_split(self, text):
+        split_calls.append(text)
+        return original_split(self, text)
+
+    monkeypatch.setattr(type(svc), "_split_json_stream", counting_split)
+
+    code, out = run_codex_stream(svc, stream)
+
+    assert code == 0
+    # Inner closing braces and braces inside strings do not trigger a re-parse
+    assert len(split_calls) == 2
+    assert split_calls[-1] == stream
+    assert '"id": "item_braces"' in out
+    assert "aggregated_output:\na } b\n{ c" in out
+
+
+def test_codex_stream_drops_hidden_event_lines_unparsed(run_codex_stream, monkeypatch):
+    svc = _load_codex_service()
+    codex_module = sys.modules[type(svc).__module__]
+    monkeypatch.setattr(codex_module, "ORJSON_AVAILABLE", False)
+    parsed = []
+    original_split = type(svc)._split_json_stream
+
+    def recording_split(self, text):
+        parsed.append(text)
+        return original_split(self, text)
+
+    monkeypatch.setattr(type(svc), "_split_json_stream", recording_split)
+    stream = "\n".join([
+        json.dumps({"msg": {"type": "turn_diff", "unified_diff": "x" * 1000}}),
+        json.dumps({"type": "exec_command_output_delta", "chunk": "y" * 1000}),
+    ]) + "\n"
+
+    code, out = run_codex_stream(svc, stream)
+
+    assert code == 0
+    assert out == ""
+    assert parsed == []
+
+
+def test_codex_stream_keeps_visible_events_next_to_hidden_type_text(run_codex_stream):
+    svc = _load_codex_service()
+    hidden = json.dumps({"msg": {"type": "turn_diff", "unified_diff": "ignored"}})
+    visible = json.dumps({"msg": {"type": "agent_message", "message": "Same line"}})
+    quoted = json.dumps({"msg": {"type": "agent_message", "message": 'Saw "type": "turn_diff" in the log'}})
+    stream = hidden + visible + "\n" + quoted + "\n"
+
+    code, out = run_codex_stream(svc, stream)
+
+    assert code == 0
+    events = [json.loads(line) for line in out.splitlines()]
+    # The hidden object is still suppressed once the line is parsed, while a
+    # visible object sharing its line and an escaped type field both survive
+    assert [e["message"] for e in events] == [
+        "Same line",
+        'Saw "type": "turn_diff" in the log',
+    ]
+
+
+def test_codex_stream_keeps_visible_events_with_nested_hidden_type_objects(run_codex_stream):
+    svc = _load_codex_service()
+    events = [
+        # Nested hidden-type object is the last object on the line
+        {"msg": {"type": "exec_command_end", "formatted_output": "done", "info": {"type": "token_count"}}},
+        # Nested hidden-type object precedes the event's own type key
+        {"msg": {"info": {"type": "turn_diff"}, "type": "agent_message", "message": "kept"}},
+        # A typed msg payload takes precedence over a hidden outer type
+        {"type": "turn_diff", "msg": {"type": "agent_message", "message": "also kept"}},
+    ]
+    stream = "".join(json.dumps(e) + "\n" for e in events)
+
+    code, out = run_codex_stream(svc, stream)
+
+    assert code == 0
+    assert '"type": "exec_command_end"' in out and "done" in out
+    assert '"message": "kept"' in out
+    assert '"message": "also kept"' in out
+
+
+def test_codex_stream_output_matches_with_and_without_orjson(run_codex_stream, monkeypatch):
+    pytest.importorskip("orjson")
+    svc = _load_codex_service()
+    codex_module = sys.modules[type(svc).__module__]
+    monkeypatch.setattr(codex_module, "_timestamp", lambda: "12:00:00 PM")
+    stream = (
+        _build_ndjson_stream()
+        + _build_nested_item_schema_stream()
+        + _build_pretty_item_schema_stream()
+    )
+
+    outputs = []
+    for use_orjson in (True, False):
+        monkeypatch.setattr(codex_module, "ORJSON_AVAILABLE", use_orjson)
+        code, out = run_codex_stream(svc, stream)
+        assert code == 0
+        outputs.append(out)
+
+    # Both parsers must render the same events, including multi-line objects
+    assert outputs[0] == outputs[1]
+    assert "message:\nFinal line one\nFinal line two" in outputs[0]
+    assert '"id": "item_122"' in outputs[0]
+
+
+def test_codex_stream_formats_valid_event_after_malformed_object(run_codex_stream):
+    svc = _load_codex_service()
+    stream = (
+        '{bad}' + json.dumps({"msg": {"type": "agent_message", "message": "Hello\nWorld"}})
+        + json.dumps({"msg": {"type": "token_count", "input": 1}}) + "\n"
+    )
+
+    code, out = run_codex_stream(svc, stream)
+
+    assert code == 0
+    assert out.startswith("{bad}\n")
+    assert "message:\nHello\nWorld" in out
+    assert "token_count" not in out
+
+
+def test_codex_command_user_configs_override_defaults():
+    import argparse
+
+    svc = _load_codex_service()
+    svc.project_path = "/tmp/project"
+    svc.model_name = "gpt-5"
+    svc.prompt = "Do the thing"
+
+    args = argparse.Namespace(configs=["sandbox_mode=read-only", "custom_flag"])
+    cmd = svc.build_codex_command(args)
+
+    configs = [cmd[i + 1] for i, part in enumerate(cmd) if part == "-c"]
+    assert configs == [
+        "include_apply_patch_tool=true",
+        "use_experimental_streamable_shell_tool=true",
+        "sandbox_mode=read-only",
+        "custom_flag",
+    ]
+    assert cmd[1:5] == ["--cd", "/tmp/project", "-m", "gpt-5"]
+    assert cmd[-3:] == ["exec", f"{svc.DEFAULT_AUTO_INSTRUCTION}\n\nDo the thing", "--json"]
+
+
+def test_split_json_stream_handles_concatenated_partial_and_malformed_objects():
+    svc = _load_codex_service()
+
+    items, pending = svc._split_json_stream('{"a": 1}{"b": {"c": "}"}} {not json}\n')
+    assert items == [{"a": 1}, {"b": {"c": "}"}}, "{not json}"]
+    assert pending == ""
+
+    items, pending = svc._split_json_stream('{"a": 1}\n{\n  "b": "unfinished\n')
+    assert items == [{"a": 1}]
+    assert pending == '{\n  "b": "unfinished\n'
+
+    # A malformed object does not swallow a valid event later on the same line
+    items, pending = svc._split_json_stream('{bad}{"msg": {"type": "agent_message", "message": "hi"}}\n')
+    assert items == ["{bad}", {"msg": {"type": "agent_message", "message": "hi"}}]
+    assert pending == ""
+
+    # Raw control characters inside strings (e.g. tabs in command output) still parse
+    items, pending = svc._split_json_stream('{"out": "col1\tcol2\nrow2"}\n')
+    assert items == [{"out": "col1\tcol2\nrow2"}]
+    assert pending == ""
@@ -0,0 +1,163 @@
+import io
+import json
+import os
+import subprocess
+import sys
+from contextlib import redirect_stdout
+
+import pytest
+
+
+def _load_gemini_service():
+    here = os.path.dirname(__file__)
+    services_dir = os.path.abspath(os.path.join(here, "..", "src", "templates", "services"))
+    if services_dir not in sys.path:
+        sys.path.insert(0, services_dir)
+    from gemini import GeminiService  # type: ignore
+    return GeminiService()
+
+
+class _FakeGeminiProcess:
+    """Popen stand-in that replays canned stdout through a real pipe."""
+
+    def __init__(self, stdout_bytes: bytes):
+        # run_gemini selects on the pipes' file descriptors, so BytesIO won't do
+        self.stdout = self._pipe_with(stdout_bytes)
+        self.stderr = self._pipe_with(b"")
+        self.returncode = None
+
+    @staticmethod
+    def _pipe_with(data: bytes):
+        read_fd, write_fd = os.pipe()
+        with os.fdopen(write_fd, "wb") as writer:
+            writer.write(data)
+        return os.fdopen(read_fd, "rb", buffering=0)
+
+    def wait(self):
+        self.stdout.close()
+        self.stderr.close()
+        self.returncode = 0
+        return 0
+
+    def terminate(self):
+        pass
+
+
+@pytest.fixture
+def run_gemini_stream(monkeypatch):
+    """Return a runner that feeds canned gemini output to svc.run_gemini in-process."""
+
+    def run(svc, stream: str):
+        stdout_bytes = stream.encode("utf-8")
+        monkeypatch.setattr(subprocess, "Popen", lambda cmd, **kwargs: _FakeGeminiProcess(stdout_bytes))
+        buf = io.StringIO()
+        with redirect_stdout(buf):
+            code = svc.run_gemini(["gemini"], verbose=False)
+        return code, buf.getvalue()
+
+    return run
+
+
+def test_split_json_stream_handles_concatenated_partial_and_malformed_objects():
+    svc = _load_gemini_service()
+
+    # Concatenated objects, with braces inside string values
+    items, pending = svc._split_json_stream('{"a": 1}{"b": {"c": "}"}} {"d": "{"}\n')
+    assert items == [{"a": 1}, {"b": {"c": "}"}}, {"d": "{"}]
+    assert pending == ""
+
+    # An incomplete trailing object is returned for the next chunk
+    items, pending = svc._split_json_stream('{"a": 1}\n{\n  "b": "unfinished\n')
+    assert items == [{"a": 1}]
+    assert pending == '{\n  "b": "unfinished\n'
+
+    items, pending = svc._split_json_stream('{"a": {"b": 1}')
+    assert items == []
+    assert pending == '{"a": {"b": 1}'
+
+    # A malformed object does not swallow a valid one later on the same line
+    items, pending = svc._split_json_stream('{bad}{"a": 1}\n')
+    assert items == ["{bad}", {"a": 1}]
+    assert pending == ""
+
+    # Plain text around objects is kept in stream order
+    items, pending = svc._split_json_stream('log line {"a": 1} trailing\n')
+    assert items == ["log line", {"a": 1}, "trailing"]
+    assert pending == ""
+
+
+def test_scan_structure_tracks_depth_and_strings_across_chunks():
+    svc = _load_gemini_service()
+    text = json.dumps({
+        "outer": {
+            "text": 'braces } { and an escaped quote " in a string',
+            "path": "C:\\dir\\",
+            "list": [{"n": 1}],
+        }
+    })
+
+    # Every split point, including one between a backslash and the character
+    # it escapes, must end at the same state as a single scan
+    assert svc._scan_structure(text, 0, False) == (0, False, False)
+    for cut in range(len(text) + 1):
+        state = svc._scan_structure(text[:cut], 0, False)
+        assert svc._scan_structure(text[cut:], *state) == (0, False, False), cut
+
+    # Depth and string state are carried over an open object
+    assert svc._scan_structure('{"a": {"b": "x}', 0, False) == (2, True, False)
+    assert svc._scan_structure('y"}', 2, True) == (1, False, False)
+    assert svc._scan_structure("}", 1, False) == (0, False, False)
+
+
+def test_scan_structure_handles_escapes():
+    svc = _load_gemini_service()
+
+    # An escaped quote does not close the string, so the brace after it is text
+    assert svc._scan_structure('{"a": "say \\"hi}\\" ', 0, False) == (1, True, False)
+    # An escaped backslash does not escape the closing quote
+    assert svc._scan_structure('{"a": "dir\\\\"}', 0, False) == (0, False, False)
+    # A backslash ending the chunk escapes the first character of the next one
+    assert svc._scan_structure('{"a": "x\\', 0, False) == (1, True, True)
+    assert svc._scan_structure('"}"}', 1, True, True) == (0, False, False)
+    # Outside a string a backslash has no effect on the next chunk
+    assert svc._scan_structure('{"a": 1 \\', 0, False) == (1, False, False)
+
+
+def test_gemini_stream_emits_events_around_malformed_and_multiline_objects(run_gemini_stream, monkeypatch):
+    svc = _load_gemini_service()
+    gemini_module = sys.modules[type(svc).__module__]
+    monkeypatch.setattr(gemini_module, "_timestamp", lambda: "12:00:00 PM")
+    multiline = json.dumps({"type": "message", "content": "first } line"}, indent=2)
+    stream = '{bad}{"type": "message", "content": "after bad"}\n' + multiline + "\n"
+
+    code, out = run_gemini_stream(svc, stream)
+
+    assert code == 0
+    lines = out.splitlines()
+    assert lines[0] == "{bad}"
+    assert json.loads(lines[1]) == {"type": "message", "datetime": "12:00:00 PM", "content": "after bad"}
+    assert json.loads(lines[2]) == {"type": "message", "datetime": "12:00:00 PM", "content": "first } line"}
+    assert len(lines) == 3
+
+
+def test_gemini_text_output_passes_through_without_pipe(monkeypatch):
+    svc = _load_gemini_service()
+    svc.output_format = "text"
+    popen_kwargs = {}
+
+    class _PassThroughProcess:
+        returncode = 0
+
+        def communicate(self):
+            return None, b""
+
+    def fake_popen(cmd, **kwargs):
+        popen_kwargs.update(kwargs)
+        return _PassThroughProcess()
+
+    monkeypatch.setattr(subprocess, "Popen", fake_popen)
+
+    assert svc.run_gemini(["gemini"], verbose=False) == 0
+    # stdout is inherited so gemini writes directly to the terminal
+    assert "stdout" not in popen_kwargs
+    assert popen_kwargs["stderr"] == subprocess.PIPE
@@ -10,6 +10,7 @@ These tests verify:
 
 import pytest
 import tempfile
+import threading
 from pathlib import Path
 from unittest.mock import Mock, patch, MagicMock
 
@@ -17,15 +18,22 @@ from unittest.mock import Mock, patch, MagicMock
 import sys
 sys.path.insert(0, str(Path(__file__).parent.parent / 'src' / 'templates' / 'scripts'))
 
+import github
 from github import (
     extract_attachment_urls,
     download_github_attachments,
     sanitize_tag,
 )
 
+try:
+    import responses
+    RESPONSES_AVAILABLE = True
+except ImportError:
+    RESPONSES_AVAILABLE = False
+
 # Import attachment helpers if available
 try:
-    from attachment_downloader import format_attachments_section
+    from attachment_downloader import AttachmentDownloader, format_attachments_section
     ATTACHMENTS_AVAILABLE = True
 except ImportError:
     ATTACHMENTS_AVAILABLE = False
@@ -138,6 +146,24 @@ class TestExtractAttachmentUrls:
         urls = extract_attachment_urls(body)
         assert len(urls) == 1
 
+    def test_deduplicate_keeps_first_seen_order(self):
+        """Test that deduplicated URLs keep body-then-comments order."""
+        body = """
+        https://github.com/user-attachments/assets/bbb/second.png
+        https://github.com/user-attachments/assets/aaa/first.png
+        """
+        comments = [
+            {'body': 'Again: https://github.com/user-attachments/assets/bbb/second.png'},
+            {'body': 'New: https://user-images.githubusercontent.com/1/third.png'}
+        ]
+
+        urls = extract_attachment_urls(body, comments)
+        assert urls == [
+            'https://github.com/user-attachments/assets/bbb/second.png',
+            'https://github.com/user-attachments/assets/aaa/first.png',
+            'https://user-images.githubusercontent.com/1/third.png',
+        ]
+
     def test_no_attachments(self):
         """Test issue without attachments."""
         body = "Just plain text, no images."
@@ -175,6 +201,27 @@ class TestExtractAttachmentUrls:
         # URL should not include closing parenthesis
         assert not urls[0].endswith(')')
 
+    def test_handles_autolinks_and_html(self):
+        """Test extraction stops at angle brackets of autolinks and HTML tags."""
+        body = """
+        <https://github.com/user-attachments/assets/abc/auto.png>
+        <img src=https://user-images.githubusercontent.com/1/tag.png>
+        """
+
+        urls = extract_attachment_urls(body)
+        assert urls == [
+            'https://github.com/user-attachments/assets/abc/auto.png',
+            'https://user-images.githubusercontent.com/1/tag.png',
+        ]
+
+    def test_repository_asset_url_does_not_span_texts(self):
+        """Test a repository asset URL cannot be stitched across body and comment."""
+        body = "Broken link https://github.com/owner"
+        comments = [{'body': 'see/repo/assets/123/image.png for the path'}]
+
+        urls = extract_attachment_urls(body, comments)
+        assert urls == []
+
     def test_empty_body(self):
         """Test with empty body."""
         urls = extract_attachment_urls("")
@@ -192,15 +239,16 @@ class TestExtractAttachmentUrls:
         assert len(urls) == 1
 
 
+@pytest.mark.skipif(not ATTACHMENTS_AVAILABLE, reason="attachment_downloader not available")
 class TestDownloadGitHubAttachments:
     """Tests for download_github_attachments function."""
 
     @pytest.fixture
     def mock_downloader(self, tmp_path):
-        """Create a mock downloader."""
-        mock = MagicMock()
-        mock.base_dir = tmp_path
-        return mock
+        """Create a downloader whose download_file is mocked."""
+        downloader = AttachmentDownloader(base_dir=str(tmp_path))
+        downloader.download_file = MagicMock()
+        return downloader
 
     def test_download_success(self, mock_downloader, tmp_path):
         """Test successful file download."""
@@ -246,6 +294,36 @@ class TestDownloadGitHubAttachments:
         assert len(paths) == 2
         assert mock_downloader.download_file.call_count == 2
 
+    def test_download_concurrent_keeps_url_order(self, mock_downloader, tmp_path):
+        """Test that concurrent downloads return paths in URL order."""
+        urls = [
+            'https://github.com/user-attachments/assets/abc/slow.png',
+            'https://github.com/user-attachments/assets/def/fast.png'
+        ]
+
+        fast_done = threading.Event()
+
+        def fake_download(url, **kwargs):
+            # Finish the first URL last to force out-of-order completion
+            if 'slow' in url:
+                assert fast_done.wait(timeout=5), "downloads did not run concurrently"
+            path = str(tmp_path / url.rsplit('/', 1)[-1])
+            if 'fast' in url:
+                fast_done.set()
+            return (path, None)
+
+        mock_downloader.download_file.side_effect = fake_download
+
+        paths = download_github_attachments(
+            urls=urls,
+            token='ghp_test_token',
+            repo='owner/repo',
+            issue_number=1,
+            downloader=mock_downloader
+        )
+
+        assert paths == [str(tmp_path / 'slow.png'), str(tmp_path / 'fast.png')]
+
     def test_download_handles_failure(self, mock_downloader):
         """Test handling of download failures."""
         urls = ['https://github.com/user-attachments/assets/abc/file.png']
@@ -333,6 +411,68 @@ class TestDownloadGitHubAttachments:
         assert 'myorg_myrepo' in str(target_dir)
 
 
+@pytest.mark.skipif(not ATTACHMENTS_AVAILABLE, reason="attachment_downloader not available")
+@pytest.mark.skipif(not RESPONSES_AVAILABLE, reason="responses library not available")
+class TestGitHubAttachmentEtags:
+    """Tests for ETag revalidation of GitHub attachment downloads."""
+
+    URL = 'https://github.com/user-attachments/assets/abc/shot.png'
+
+    def _download(self, tmp_path, issue_number):
+        return download_github_attachments(
+            urls=[self.URL],
+            token='ghp_test_token',
+            repo='owner/repo',
+            issue_number=issue_number,
+            downloader=AttachmentDownloader(base_dir=str(tmp_path))
+        )
+
+    @responses.activate
+    def test_unchanged_attachment_is_revalidated(self, tmp_path):
+        """Test a repeat download of the same issue reuses the file on 304."""
+        responses.add(responses.GET, self.URL, body=b'png', status=200, headers={'ETag': '"v1"'})
+        responses.add(
+            responses.GET,
+            self.URL,
+            status=304,
+            match=[responses.matchers.header_matcher({'If-None-Match': '"v1"'})]
+        )
+
+        first = self._download(tmp_path, 1)
+        second = self._download(tmp_path, 1)
+
+        assert second == first
+        assert responses.calls[1].response.status_code == 304
+        target_dir = tmp_path / 'github' / 'owner_repo'
+        assert sorted(p.name for p in target_dir.iterdir()) == [
+            github.GITHUB_ETAG_CACHE_FILENAME, 'issue_1_shot.png', 'issue_1_shot.png.meta.json'
+        ]
+
+    @responses.activate
+    def test_cached_path_is_not_shared_between_issues(self, tmp_path):
+        """Test another issue linking the same URL gets its own file and metadata."""
+        responses.add(responses.GET, self.URL, body=b'png', status=200, headers={'ETag': '"v1"'})
+
+        first = self._download(tmp_path, 1)
+        second = self._download(tmp_path, 2)
+
+        assert 'If-None-Match' not in responses.calls[1].request.headers
+        assert Path(first[0]).name == 'issue_1_shot.png'
+        assert Path(second[0]).name == 'issue_2_shot.png'
+        assert Path(second[0] + '.meta.json').exists()
+
+    def test_saved_cache_is_bounded(self, tmp_path, monkeypatch):
+        """Test the cache keeps only the newest entries and leaves no temp files."""
+        monkeypatch.setattr(github, 'GITHUB_ETAG_CACHE_MAX_ENTRIES', 2)
+        cache_path = tmp_path / github.GITHUB_ETAG_CACHE_FILENAME
+        etags = {f'issue_1 url{i}': {'etag': f'"{i}"', 'path': f'p{i}'} for i in range(3)}
+
+        github._save_attachment_etags(cache_path, etags)
+
+        assert list(github._load_attachment_etags(cache_path)) == ['issue_1 url1', 'issue_1 url2']
+        assert [p.name for p in tmp_path.iterdir()] == [github.GITHUB_ETAG_CACHE_FILENAME]
+
+
 @pytest.mark.skipif(not ATTACHMENTS_AVAILABLE, reason="attachment_downloader not available")
 class TestFormatAttachmentsSection:
     """Tests for formatting attachment sections in task text."""
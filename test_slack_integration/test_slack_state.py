@@ -222,6 +222,35 @@ class TestSlackStateManager:
         finally:
             os.unlink(state_file)
 
+    def test_mark_processed_many_appends_batch(self):
+        """mark_processed_many should record a batch and skip duplicates."""
+        with tempfile.NamedTemporaryFile(suffix='.ndjson', delete=False) as f:
+            state_file = f.name
+
+        try:
+            mgr = SlackStateManager(state_file)
+            mgr.mark_processed('ts1', 'task_1', {'text': 'Existing'})
+
+            recorded = mgr.mark_processed_many([
+                ('ts1', 'task_dup', {'text': 'Already processed'}),
+                ('ts2', 'task_2', {'text': 'Second'}),
+                ('ts3', 'task_3', {'text': 'Third'}),
+                ('ts2', 'task_dup', {'text': 'Repeated in batch'}),
+            ])
+
+            assert recorded == 2
+            assert mgr.get_message_count() == 3
+            assert mgr.get_last_timestamp() == 'ts3'
+            assert mgr.get_task_id_for_message('ts2') == 'task_2'
+
+            # Batch entries are persisted in the same format as mark_processed
+            mgr2 = SlackStateManager(state_file)
+            assert mgr2.get_message_count() == 3
+            assert mgr2.get_message_for_task('task_3')['text'] == 'Third'
+            assert mgr2.get_message_for_task('task_dup') is None
+        finally:
+            os.unlink(state_file)
+
     def test_handles_corrupted_file_gracefully(self):
         """StateManager should handle corrupted files gracefully."""
         with tempfile.NamedTemporaryFile(suffix='.ndjson', mode='w', delete=False) as f: